@@ -0,0 +1,269 @@
+import contextlib
+import gc
+import importlib
+import json
+import os
+import platform
+import sys
+import tempfile
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'file_merging'))
+from logic.models import Liberty
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_liberty.json')
+
+baseline_file = sys.argv[1] if len(sys.argv) > 1 else BASELINE             # путь до файла с эталонными замерами
+mode = sys.argv[2] if len(sys.argv) > 2 else 'check'                      # check - сравнить с эталоном, update - записать эталон
+threshold = float(sys.argv[3]) if len(sys.argv) > 3 else 0.2             # допустимое ухудшение относительно эталона
+repeats = 5                                                               # количество повторов каждого замера
+retries = 2                                                               # количество перезапусков замеров с ухудшением
+
+SAMPLE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'file_merging', 'logic', 'doc', 'templates',
+                      'Nangate_cut.lib')
+CUSTOMIZATIONS = {'liberty_custom': 'logic.liberty_custom',
+                  'template_custom': 'logic.doc.templates.liberty'}
+
+
+def scaled_cells(text, copies):
+    """
+    Return sample library with its cells repeated copies times under new names.
+    text: sample library text
+    copies: number of copies of every cell
+    """
+    start = text.index('\ncell (')
+    end = text.rindex('}')
+    cells = text[start:end]
+    return text[:start] + ''.join(cells.replace('\ncell (', '\ncell (c{}_'.format(i)) for i in range(copies)) \
+        + text[end:]
+
+
+def large_tables(size, cells):
+    """
+    Return synthetic library with size x size timing tables.
+    size: number of points of each table axis
+    cells: number of cells
+    """
+    index = '"' + ', '.join('{:.4f}'.format(0.01 * (i + 1)) for i in range(size)) + '"'
+    row = '"' + ', '.join('{:.5f}'.format(0.001 * (i + 1)) for i in range(size)) + '"'
+    values = ', \\\n'.join([row] * size)
+    table = '        {} (table_{}) {{\n          index_1 ({});\n          index_2 ({});\n' \
+            '          values ({});\n        }}\n'
+    lines = ['library (large_tables) {\n',
+             '  lu_table_template (table_{}) {{\n'.format(size),
+             '    variable_1 : input_net_transition;\n    variable_2 : total_output_net_capacitance;\n',
+             '    index_1 ({});\n    index_2 ({});\n  }}\n'.format(index, index)]
+    for c in range(cells):
+        lines.append('  cell (CELL_{}) {{\n    area : 1.0;\n    pin (Z) {{\n      direction : output;\n'.format(c))
+        lines.append('      timing () {\n        related_pin : "A";\n')
+        for kind in ('cell_rise', 'cell_fall', 'rise_transition', 'fall_transition'):
+            lines.append(table.format(kind, size, index, index, values))
+        lines.append('      }\n    }\n  }\n')
+    lines.append('}\n')
+    return ''.join(lines)
+
+
+def repeated_attributes(count):
+    """
+    Return synthetic library with count repetitions of simple and complex attributes.
+    count: number of repetitions
+    """
+    lines = ['library (repeated_attributes) {\n']
+    for i in range(count):
+        lines.append('  define (attr_{}, cell, string);\n'.format(i))
+        lines.append('  comment : "repeated comment";\n')
+        lines.append('  library_features (report_delay_calculation);\n')
+    lines.append('}\n')
+    return ''.join(lines)
+
+
+def char_scan(s):
+    """
+    Reference tokenizer: walks the string one character at a time, as Liberty.load did before.
+    Return number of events.
+    """
+    events = 0
+    for nextpos in range(len(s)):
+        ch = s[nextpos]
+        if ch == '}':
+            events += 1
+        elif ch == '{':
+            events += 1
+        elif ch == ';':
+            events += 1
+    return events
+
+
+def regex_scan(s):
+    """
+    Tokenizer used by Liberty.load: jumps between delimiters with a compiled regex.
+    Return number of events.
+    """
+    events = 0
+    for _ in Liberty._DELIMITER.finditer(s):
+        events += 1
+    return events
+
+
+def count_groups(group):
+    """
+    Return number of groups in the library tree.
+    """
+    count = 1
+    for n, a in group.fields():
+        if n.startswith('_') or n == 'name':
+            continue
+        items = a.values() if isinstance(a, dict) else a if isinstance(a, list) else [a]
+        count += sum(count_groups(item) for item in items if isinstance(item, Liberty._LibertyGroup))
+    return count
+
+
+def customization(name):
+    """
+    Switch parser to the customization, None means default parser.
+    """
+    Liberty.set_default_parser()
+    if name is not None:
+        module = CUSTOMIZATIONS[name]
+        if module in sys.modules:
+            importlib.reload(sys.modules[module])
+        else:
+            importlib.import_module(module)
+
+
+def machine():
+    """
+    Return description of the machine and Python, baselines are only compared on the same one.
+    """
+    return {'node': platform.node(), 'machine': platform.machine(), 'cpus': os.cpu_count(),
+            'python': platform.python_version()}
+
+
+def measure(func):
+    """
+    Return best time of one run, peak traced memory and number of new gc-tracked objects kept by the result.
+    Each of several rounds repeats func until it takes at least 0.2 s, the best average of rounds is taken,
+    so short cases are not dominated by timer resolution and noise.
+    """
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    best = min(timer.repeat(repeat=repeats, number=number)) / number
+
+    gc.collect()
+    objects = len(gc.get_objects())
+    tracemalloc.start()
+    result = func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    gc.collect()
+    objects = len(gc.get_objects()) - objects
+    del result
+    return best, peak, objects
+
+
+def run(work_dir, only=None):
+    """
+    Run benchmarks, return {name: {time, mb_s, peak_mb, objects, groups}}.
+    only: names of benchmarks to run, all by default
+    """
+    with open(SAMPLE) as f:
+        sample = f.read()
+    variants = {'nangate': sample,
+                'cells_x20': scaled_cells(sample, 20),
+                'large_tables': large_tables(40, 50),
+                'repeated_attributes': repeated_attributes(5000)}
+
+    results = {}
+    for variant, text in variants.items():
+        lib_file = os.path.join(work_dir, variant + '.lib')
+        with open(lib_file, 'w') as f:
+            f.write(text)
+        size = os.path.getsize(lib_file) / 1e6
+
+        def timed(case, func):
+            key = variant + '/' + case
+            if only is None or key in only:
+                results[key] = measure(func) + (size,)
+
+        customization(None)
+        lib = Liberty.load(lib_file)
+        cases = {'load': lambda: Liberty.load(lib_file),
+                 'dump': lambda: Liberty.dump(lib, os.path.join(work_dir, 'dump.lib')),
+                 'to_json': lambda: Liberty.to_json(lib, filename=os.path.join(work_dir, 'dump.json'))}
+        for case, func in cases.items():
+            timed(case, func)
+
+        # сравнение посимвольного разбора с разбором регулярным выражением на подготовленном тексте
+        clean = Liberty.preprocess(text)
+        assert char_scan(clean) == regex_scan(clean)
+        timed('tokenize_chars', lambda: char_scan(clean))
+        timed('tokenize_regex', lambda: regex_scan(clean))
+        groups = count_groups(lib)
+
+        for name in CUSTOMIZATIONS:
+            customization(name)
+            timed('load_' + name, lambda: Liberty.load(lib_file))
+        customization(None)
+
+        for key in results:
+            if key.startswith(variant + '/') and isinstance(results[key], tuple):
+                best, peak, objects, size = results[key]
+                results[key] = {'time': best, 'mb_s': size / best, 'peak_mb': peak / 1e6, 'objects': objects,
+                                'groups': groups}
+    return results
+
+
+def compare(result, base):
+    """
+    Return list of descriptions of result's regressions against the baseline result.
+    """
+    flags = []
+    if base is not None:
+        if result['mb_s'] < base['mb_s'] * (1 - threshold):
+            flags.append('throughput {:.1f} < {:.1f}'.format(result['mb_s'], base['mb_s']))
+        if result['peak_mb'] > base['peak_mb'] * (1 + threshold):
+            flags.append('memory {:.2f} > {:.2f}'.format(result['peak_mb'], base['peak_mb']))
+    return flags
+
+
+baseline = {}
+if os.path.exists(baseline_file):
+    with open(baseline_file) as f:
+        baseline = json.load(f)
+same_machine = baseline.get('machine') == machine()
+base_results = baseline.get('results', {})
+
+with tempfile.TemporaryDirectory() as work_dir, open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+    results = run(work_dir)
+    # замеры с ухудшением повторяются, берётся лучший результат, чтобы случайная нагрузка не считалась регрессией
+    for _ in range(retries if same_machine and mode != 'update' else 0):
+        flagged = {key for key, result in results.items() if compare(result, base_results.get(key))}
+        if not flagged:
+            break
+        for key, result in run(work_dir, flagged).items():
+            results[key] = {**result,
+                            'time': min(result['time'], results[key]['time']),
+                            'mb_s': max(result['mb_s'], results[key]['mb_s']),
+                            'peak_mb': min(result['peak_mb'], results[key]['peak_mb'])}
+
+if baseline and not same_machine:
+    print(f'baseline {baseline_file} was recorded on {baseline.get("machine")}, not on {machine()}:')
+    print('differences are shown but not treated as regressions, run with "update" to record a baseline here')
+
+regressions = []
+print(f'{"benchmark":45} {"MB/s":>9} {"peak MB":>9} {"objects":>9} {"groups":>7}')
+for key, result in results.items():
+    flags = compare(result, base_results.get(key))
+    print(f'{key:45} {result["mb_s"]:9.2f} {result["peak_mb"]:9.2f} {result["objects"]:9} {result["groups"]:7}'
+          + (('  REGRESSION: ' if same_machine else '  differs: ') + ', '.join(flags) if flags else ''))
+    if flags and same_machine:
+        regressions.append(key)
+
+if mode == 'update' or not baseline:
+    with open(baseline_file, 'w') as f:
+        json.dump({'machine': machine(), 'results': results}, f, indent=2)
+    print(f'baseline written to {baseline_file}')
+
+if regressions and mode != 'update':
+    exit(1)
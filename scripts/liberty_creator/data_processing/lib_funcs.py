@@ -1,4 +1,10 @@
-from typing import Any, List, Tuple
+from functools import lru_cache
+from typing import Any, Dict, List, Tuple
+import copy
+import os
+import re
+
+STATEMENT = re.compile(r'(?:"[^"]*"|[^";])*;')    # оператор до первой ; вне кавычек
 
 """
 Класс, содержащий информацию об имени, переменных и индексах шаблона из файла формата Liberty
@@ -10,46 +16,146 @@ class Template:
         self.indices: List[List[float]] = []
 
 """
-Функция возвращает массив экземляров класса Template из файла формата Liberty
+Класс, содержащий информацию из заголовка файла формата Liberty (всё, что находится до первой ячейки):
+атрибуты уровня библиотеки, условия характеризации operating_conditions и шаблоны lu_table_template
 """
-def parse_templates(file_path: str) -> List[Template]:
-    template_list = []
+class LibraryHeader:
+    def __init__(self):
+        self.name = ''
+        self.attributes: Dict[str, str] = {}                        # атрибуты уровня библиотеки (первое вхождение)
+        self.operating_conditions: Dict[str, Dict[str, str]] = {}   # атрибуты групп operating_conditions по именам
+        self.templates: List[Template] = []
+
+
+"""
+Функция возвращает значение простого (name : value;) или составного (name (value);) атрибута из строки
+"""
+def attribute_value(line: str) -> str:
+    if ':' in line:
+        return line[line.find(':') + 1:line.rfind(';')].strip().replace('"', '')
+    return line[line.find('(') + 1:line.rfind(')')].strip().replace('"', '')
+
+
+"""
+Функция возвращает кортеж (code, in_comment): часть строки без комментариев /* */ и // и признак того,
+что строка заканчивается внутри многострочного комментария
+"""
+def strip_comments(line: str, in_comment: bool) -> Tuple[str, bool]:
+    code = []
+    pos = 0
+    while pos < len(line):
+        if in_comment:
+            end = line.find('*/', pos)
+            if end == -1:
+                break
+            in_comment = False
+            pos = end + 2
+            continue
+
+        # поиск начала комментария вне кавычек
+        quoted = False
+        for i in range(pos, len(line)):
+            ch = line[i]
+            if ch == '"':
+                quoted = not quoted
+            elif not quoted and line.startswith('/*', i):
+                code.append(line[pos:i] + ' ')
+                in_comment = True
+                pos = i + 2
+                break
+            elif not quoted and line.startswith('//', i):
+                code.append(line[pos:i])
+                return ''.join(code), False
+        else:
+            code.append(line[pos:])
+            break
+
+    return ''.join(code), in_comment
+
+
+"""
+Функция возвращает экземпляр класса LibraryHeader из файла формата Liberty
+Файл читается однократно до первой строки с группой cell, комментарии пропускаются
+Результат запоминается для файла с неизменными размером и временем модификации,
+каждый вызов возвращает отдельную копию, которую можно изменять
+"""
+def scan_header(file_path: str) -> LibraryHeader:
+    stat = os.stat(file_path)
+    return copy.deepcopy(scan_header_cached(file_path, stat.st_size, stat.st_mtime_ns))
+
+
+@lru_cache(maxsize=16)
+def scan_header_cached(file_path: str, size: int, mtime: int) -> LibraryHeader:
+    header = LibraryHeader()
     is_template_section = False # флаг секции шаблона
-    f = open(file_path, 'r')
     template = Template()
-    
-    for line in f:
-        # проверка начала секции шаблона
-        if not is_template_section and line.strip().startswith('lu_table_template'):
-            is_template_section = True
-            name = line[line.find('(') + 1:line.find(')')].replace('"', '').strip() # получение имени шаблона в скобках
-            template = Template(name)                                               # создание экземляра очерендного шаблона
-
-        if is_template_section:
-
-            # обработка строки с переменной
-            if 'variable' in line:
-                var = line[line.find(':') + 1:line.find(';')].replace('"', '').strip()
-                template.variables.append(var)
-
-            # обработка строки с индексами переменной
-            if 'index' in line:
-                index_list = list()
-                index_line = line[line.find('(') + 1:line.find(')')].replace('"', '').strip()
-                temp_list = index_line.replace(' ', '').split(',')
-                for ind in temp_list:
-                    index_list.append(float(ind))
-                template.indices.append(index_list)
-
-            # проверка конца секции шаблона
-            if '}' in line:
-                is_template_section = False
-                template_list.append(template)
-
-        if 'cell(' in line.replace(' ', ''):
-            break
+    depth = 0                   # уровень вложенности групп
+    group = None                # атрибуты текущей группы operating_conditions
+    in_comment = False          # флаг многострочного комментария
+
+    with open(file_path, 'r') as f:
+        for line in f:
+            line, in_comment = strip_comments(line, in_comment)
+            if 'cell(' in line.replace(' ', ''):
+                break
+
+            stripped = line.strip()
+
+            # проверка начала секции шаблона
+            if not is_template_section and stripped.startswith('lu_table_template'):
+                is_template_section = True
+                name = line[line.find('(') + 1:line.find(')')].replace('"', '').strip() # получение имени шаблона в скобках
+                template = Template(name)                                               # создание экземляра очерендного шаблона
+
+            if is_template_section:
+
+                # обработка строки с переменной
+                if 'variable' in line:
+                    var = line[line.find(':') + 1:line.find(';')].replace('"', '').strip()
+                    template.variables.append(var)
+
+                # обработка строки с индексами переменной
+                if 'index' in line:
+                    index_list = list()
+                    index_line = line[line.find('(') + 1:line.find(')')].replace('"', '').strip()
+                    temp_list = index_line.replace(' ', '').split(',')
+                    for ind in temp_list:
+                        index_list.append(float(ind))
+                    template.indices.append(index_list)
+
+                # проверка конца секции шаблона
+                if '}' in line:
+                    is_template_section = False
+                    header.templates.append(template)
+
+            # обработка заголовков групп и атрибутов уровня библиотеки и operating_conditions
+            statement = STATEMENT.match(stripped)
+            if stripped.endswith('{'):
+                name = line[line.find('(') + 1:line.rfind(')')].replace('"', '').strip()
+                if depth == 0 and stripped.startswith('library'):
+                    header.name = name
+                elif depth == 1 and stripped.startswith('operating_conditions'):
+                    group = header.operating_conditions.setdefault(name, {})
+            elif statement:
+                statement = statement.group(0)
+                attr_name = statement.split(':')[0].split('(')[0].strip()
+                if depth == 1:
+                    header.attributes.setdefault(attr_name, attribute_value(statement))
+                elif depth == 2 and group is not None:
+                    group.setdefault(attr_name, attribute_value(statement))
+
+            depth += line.count('{') - line.count('}')
+            if depth < 2:
+                group = None
+
+    return header
 
-    return template_list
+
+"""
+Функция возвращает массив экземляров класса Template из файла формата Liberty
+"""
+def parse_templates(file_path: str) -> List[Template]:
+    return scan_header(file_path).templates
 
 
 """
@@ -113,12 +219,8 @@ def get_conditions(file_path: str) -> Tuple[bool, str]:
     result = ""
     conditions = ""
 
-    f = open(file_path, 'r')
-    # поиск нужной строки
-    for line in f:
-        if line.strip().startswith('default_operating_conditions'):
-            conditions = line[line.find(':') + 1:line.rfind(';')].strip().replace('"', '')
-            break
+    # поиск нужного атрибута в заголовке библиотеки
+    conditions = scan_header(file_path).attributes.get('default_operating_conditions', '')
 
     # обработка ошибки в случае, если искомая строка не найдена
     if not conditions:
@@ -140,12 +242,8 @@ def get_leakage_power_unit(file_path: str) -> Tuple[bool, str]:
     result = ""
     leakage_power_unit = ""
 
-    f = open(file_path, 'r')
-    # поиск нужной строки
-    for line in f:
-        if line.strip().startswith('leakage_power_unit'):
-            leakage_power_unit = line[line.find(':') + 1:line.rfind(';')].strip().replace('"', '')
-            break
+    # поиск нужного атрибута в заголовке библиотеки
+    leakage_power_unit = scan_header(file_path).attributes.get('leakage_power_unit', '')
 
     # обработка ошибки в случае, если искомая строка не найдена
     if not leakage_power_unit:
@@ -1,3 +1,9 @@
+from file_merging import misc_funcs
+
+
+TABLE_KINDS = ('cell_fall', 'cell_rise', 'fall_transition', 'rise_transition')
+
+
 def data_bus_init(timing_data, key):
     cell_fall_data = []
     cell_rise_data = []
@@ -7,23 +13,23 @@ def data_bus_init(timing_data, key):
     for bus in timing_data[key]:
         for item in bus:
             if hasattr(item, 'cell_fall'):
-                cell_fall_data.append(item.cell_fall)
+                cell_fall_data.append(misc_funcs.table_values(item.cell_fall))
             if hasattr(item, 'cell_rise'):
-                cell_rise_data.append(item.cell_rise)
+                cell_rise_data.append(misc_funcs.table_values(item.cell_rise))
             if hasattr(item, 'fall_transition'):
-                fall_transition_data.append(item.fall_transition)
+                fall_transition_data.append(misc_funcs.table_values(item.fall_transition))
             if hasattr(item, 'rise_transition'):
-                rise_transition_data.append(item.rise_transition)
+                rise_transition_data.append(misc_funcs.table_values(item.rise_transition))
     return cell_fall_data, cell_rise_data, fall_transition_data, rise_transition_data
 
 
 def table_merge(data):
-    all_data = []
-    temp_data = []
-    names = []
+    """
+    Merge tables with the same template name, return {template name: merged values}.
+    data: list of {template name: values} dictionaries from data_bus_init
+    """
     temp_dict = {}
-
-    data_name = set()
+    all_data = {}
 
     left_bracket = ''
     right_bracket = ''
@@ -34,26 +40,11 @@ def table_merge(data):
 
     for item in data:
         for name, value in item.items():
-            data_name.add(name)
-            all_data.append({name: value.values})
-
-    for item in all_data:
-        for name, values in item.items():
-            names.append(name)
-
-    names = list(set(names))
-
-    for name in names:
-        for item in all_data:
-            if name in item.keys():
-                temp_data.append(item[name])
-        temp_dict[name] = temp_data
-        temp_data = []
+            if name not in temp_dict:
+                temp_dict[name] = []
+            temp_dict[name].append(value)
 
-    all_data.clear()
-
-    for name, values in temp_dict.items():
-        temp_data = temp_dict[name]
+    for name, temp_data in temp_dict.items():
         temp_value = ''
 
         for counter, value in enumerate(temp_data):
@@ -81,17 +72,33 @@ def table_merge(data):
             comma = ''
             line_feed = '\n'
 
-        all_data.append({name: temp_value})
-    return all_data, list(data_name)
+        all_data[name] = tuple(temp_value.replace(',', ' ').split())
+    return all_data
+
 
+def merge_bus_pin(tables):
+    """
+    Merge all tables of one bus pin.
+    Runs in worker processes, so it only gets plain values of the pin's tables.
+    tables: cell_fall, cell_rise, fall_transition and rise_transition values from data_bus_init
+    """
+    return tuple(table_merge(data) for data in tables)
 
-def final_bus_data(data_files):
-    timing_pin_names = []
+
+def final_bus_data(data_files, workers=1):
+    """
+    Merge timing tables of bus pins from all grid files into the cell of the first file.
+    Object-tree merge helper, not called by main.merge_lib: the merge flow merges the grid
+    files line by line with merging.merge, so workers here does not affect merge_lib.py.
+    data_files: loaded grid libraries
+    workers: number of processes used to merge tables of different pins
+    """
     timing_data = {}
     pins = []
     values = []
     cell_name = ''
     keys_bus = []
+    bus_final_data = {}
 
     for lib in data_files:
         for name, value in lib.cell.items():
@@ -99,135 +106,37 @@ def final_bus_data(data_files):
                 cell_name = name
             values.append(value)
 
-
     for item in values:
         if hasattr(item, 'bus'):
-            keys_bus = []
-            values_bus = []
-            bus_final_data = {}
-
-            for name, value in item.bus.items():
-                keys_bus.append(name)
-                values_bus.append(value)
-
-            for key in keys_bus:
-                for value in values_bus:
-                    if value.name == key:
-                        for item in value.pin.values():
-                            if hasattr(item, 'timing'):
-                                timing_pin_names.append(item.name)
-                    timing_pin_names = list(set(timing_pin_names))
-
-            for value in values_bus:
-                for pin_instance in value.pin:
-                    if pin_instance in timing_pin_names:
-                        if pin_instance not in timing_data:
-                            pins.append(pin_instance)
-                            timing_data[pin_instance] = []
-                        if pin_instance in timing_data:
-                            timing_data[pin_instance].append(value.pin[pin_instance].timing)
+            keys_bus = list(item.bus)
+
+            for bus_pins in misc_funcs.bus_timing_index(item).values():
+                for pin_name, timing in bus_pins.items():
+                    if pin_name not in timing_data:
+                        pins.append(pin_name)
+                        timing_data[pin_name] = []
+                    timing_data[pin_name].append(timing)
 
             for key in pins:
                 bus_final_data[key] = timing_data[key][0]
 
-    if len(pins) != 0:
-        for key in pins:
-            temp_cell_fall_data, temp_cell_rise_data, \
-            temp_fall_transition_data, temp_rise_transition_data = data_bus_init(timing_data, key)
-
-            cell_fall_data, cell_fall_names = table_merge(temp_cell_fall_data)
-            cell_rise_data, cell_rise_names = table_merge(temp_cell_rise_data)
-            fall_transition_data, fall_transition_names = table_merge(temp_fall_transition_data)
-            rise_transition_data, rise_transition_names = table_merge(temp_rise_transition_data)
-
-            if hasattr(bus_final_data[key][0], 'cell_fall'):
-                for related_pin_instance in bus_final_data[key]:
-                    pin_template_names = []
-                    for template_name in related_pin_instance.cell_fall.keys():
-                        pin_template_names.append(template_name)
-
-                    for pin_template_name in pin_template_names:
-                        if pin_template_name in cell_fall_names \
-                                and pin_template_name in related_pin_instance.cell_fall.keys():
-                            for cell_related_template in cell_fall_data:
-                                if pin_template_name in cell_related_template:
-                                    cell_related_template[pin_template_name] = cell_related_template[pin_template_name].replace(',', ' ')
-                                    related_pin_instance.cell_fall[pin_template_name].values = \
-                                        tuple(cell_related_template[pin_template_name].split())
-
-            if hasattr(bus_final_data[key][0], 'cell_rise'):
-                for related_pin_instance in bus_final_data[key]:
-                    pin_template_names = []
-                    for template_name in related_pin_instance.cell_rise.keys():
-                        pin_template_names.append(template_name)
-
-                    for pin_template_name in pin_template_names:
-                        if pin_template_name in cell_rise_names \
-                                and pin_template_name in related_pin_instance.cell_rise.keys():
-                            for cell_related_template in cell_rise_data:
-                                if pin_template_name in cell_related_template:
-                                    cell_related_template[pin_template_name] = cell_related_template[
-                                        pin_template_name].replace(',', ' ')
-                                    related_pin_instance.cell_rise[pin_template_name].values = \
-                                        tuple(cell_related_template[pin_template_name].split())
-
-            if hasattr(bus_final_data[key][0], 'fall_transition'):
-                for related_pin_instance in bus_final_data[key]:
-                    pin_template_names = []
-                    for template_name in related_pin_instance.fall_transition.keys():
-                        pin_template_names.append(template_name)
-
-                    for pin_template_name in pin_template_names:
-                        if pin_template_name in fall_transition_names \
-                                and pin_template_name in related_pin_instance.fall_transition.keys():
-
-                            for cell_related_template in fall_transition_data:
-                                if pin_template_name in cell_related_template:
-                                    cell_related_template[pin_template_name] = cell_related_template[
-                                        pin_template_name].replace(',', ' ')
-                                    related_pin_instance.fall_transition[pin_template_name].values = \
-                                        tuple(cell_related_template[pin_template_name].split())
-
-            if hasattr(bus_final_data[key][0], 'rise_transition'):
-                for related_pin_instance in bus_final_data[key]:
-                    pin_template_names = []
-                    for template_name in related_pin_instance.rise_transition.keys():
-                        pin_template_names.append(template_name)
-
-                    for pin_template_name in pin_template_names:
-                        if pin_template_name in rise_transition_names \
-                                and pin_template_name in related_pin_instance.rise_transition.keys():
-                            for cell_related_template in rise_transition_data:
-                                if pin_template_name in cell_related_template:
-                                    cell_related_template[pin_template_name] = cell_related_template[
-                                        pin_template_name].replace(',', ' ')
-                                    related_pin_instance.rise_transition[pin_template_name].values = \
-                                        tuple(cell_related_template[pin_template_name].split())
-
-            #for index, name in enumerate(cell_fall_names):
-            #    if name in bus_final_data[key][index].cell_fall.keys():
-            #        bus_final_data[key][index].cell_fall[cell_fall_names[index]].values = cell_fall_data[index][name]
-
-            #for index, name in enumerate(cell_rise_names):
-            #    if name in bus_final_data[key][index].cell_rise.keys():
-            #        bus_final_data[key][index].cell_rise[cell_rise_names[index]].values = cell_rise_data[index][name]
-
-            #for index, name in enumerate(fall_transition_names):
-            #    if name in bus_final_data[key][index].fall_transition.keys():
-            #        bus_final_data[key][index].fall_transition[fall_transition_names[index]].values = \
-            #            fall_transition_data[index][name]
-
-            #for index, name in enumerate(rise_transition_names):
-            #    if name in bus_final_data[key][index].rise_transition.keys():
-            #        bus_final_data[key][index].rise_transition[rise_transition_names[index]].values = \
-            #            rise_transition_data[index][name]
-
-
-    if len(keys_bus) != 0:
-        for key in keys_bus:
-            for item in pins:
-                if item in values[0].bus[key].pin:
-                    values[0].bus[key].pin[item].timing[0] = bus_final_data[item][0]
+    tables = [data_bus_init(timing_data, key) for key in pins]
+    merged_tables = misc_funcs.parallel_map(merge_bus_pin, tables, workers)
+
+    for key, merged in zip(pins, merged_tables):
+        for table_kind, merged_data in zip(TABLE_KINDS, merged):
+            if not hasattr(bus_final_data[key][0], table_kind):
+                continue
+
+            for related_pin_instance in bus_final_data[key]:
+                for template_name, table in getattr(related_pin_instance, table_kind).items():
+                    if template_name in merged_data:
+                        table.values = merged_data[template_name]
+
+    for key in keys_bus:
+        for item in values[0].bus[key].pin:
+            if item in bus_final_data:
+                values[0].bus[key].pin[item].timing[0] = bus_final_data[item][0]
 
     final_data = values[0]
     return final_data
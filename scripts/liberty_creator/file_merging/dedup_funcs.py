@@ -0,0 +1,168 @@
+import io
+
+
+def dumped_size(group):
+    """
+    Return size of the group in the dumped .lib.
+    group: any group of a library
+    """
+    buffer = io.StringIO()
+    group.dump(buffer, '')
+    return len(buffer.getvalue())
+
+
+def normalize_index(value):
+    """
+    Return index or variable as a tuple of its items, numeric items are converted to float.
+    Templates read from a file and templates built during merge quote and separate items differently,
+    so they are compared by content.
+    value: string, tuple or list value of an attribute
+    """
+    if isinstance(value, (tuple, list)):
+        value = ','.join(value)
+    items = value.replace('"', '').replace(',', ' ').split()
+    try:
+        return tuple(float(item) for item in items)
+    except ValueError:
+        return tuple(items)
+
+
+def template_key(template):
+    """
+    Return hashable key describing variables and indices of lu_table_template.
+    template: lu_table_template group
+    """
+    key = []
+    for n, a in template.fields():
+        if n.startswith('_') or callable(a) or n == 'name':
+            continue
+        key.append((n, normalize_index(a)))
+    return tuple(sorted(key))
+
+
+def dedup_templates(lib):
+    """
+    Collapse lu_table_templates with identical variables and indices into the first of them.
+    Return dictionary of removed template names mapped to the names that replace them
+    and the number of bytes saved.
+    lib: merged library
+    """
+    renamed = {}
+    saved = 0
+
+    if not hasattr(lib, 'lu_table_template'):
+        return renamed, saved
+
+    kept = {}
+    templates = {}
+    for name, template in lib.lu_table_template.items():
+        key = template_key(template)
+        if key in kept:
+            renamed[name] = kept[key]
+            saved += dumped_size(template)
+        else:
+            kept[key] = name
+            templates[name] = template
+    lib.lu_table_template = templates
+
+    return renamed, saved
+
+
+def dedup_tables(group, templates, renamed, shared, report):
+    """
+    Rename tables of removed templates, drop index_N of tables which repeat their template
+    and share identical values between tables.
+    Liberty has no way to reference one table from several timing arcs,
+    so identical values are only shared in memory and counted in report.
+
+    group: group to process recursively
+    templates: remaining lu_table_templates of the library
+    renamed: removed template names mapped to the names that replace them
+    shared: values seen so far, used to share identical values
+    report: dictionary with counters
+    """
+    for n, a in group.fields():
+        if n.startswith('_') or callable(a) or n == 'name':
+            continue
+        if isinstance(a, dict):
+            if any(name in renamed for name in a):
+                tables = {}
+                for name, item in a.items():
+                    new_name = renamed.get(name, name) if hasattr(item, 'values') else name
+                    if new_name in a and new_name != name:
+                        new_name = name
+                    item.name = new_name
+                    tables[new_name] = item
+                setattr(group, n, tables)
+                a = tables
+            items = a.values()
+        elif isinstance(a, list):
+            items = a
+        else:
+            continue
+
+        for item in items:
+            if not hasattr(item, '_name'):
+                continue
+            if hasattr(item, 'values') and item._name != 'lu_table_template':
+                dedup_table(item, templates, shared, report)
+            dedup_tables(item, templates, renamed, shared, report)
+
+
+def dedup_table(table, templates, shared, report):
+    """
+    Drop index_N of the table which repeat its template and share identical values.
+    table: timing or constraint table
+    templates: lu_table_templates of the library
+    shared: values seen so far
+    report: dictionary with counters
+    """
+    template = templates.get(table.name)
+    if template is not None:
+        indices = [n for n, a in table.fields()
+                   if n.startswith('index_') and hasattr(template, n)
+                   and normalize_index(a) == normalize_index(getattr(template, n))]
+        if indices:
+            size = dumped_size(table)
+            for n in indices:
+                delattr(table, n)
+            report['indices'] += len(indices)
+            report['bytes'] += size - dumped_size(table)
+
+    values = table.values
+    if isinstance(values, list):
+        return
+    if values in shared:
+        table.values = shared[values]
+        report['tables'] += 1
+    else:
+        shared[values] = values
+
+
+def dedup_library(lib):
+    """
+    Optional deduplication pass of the merged library.
+    Identical lu_table_templates are collapsed, tables are renamed accordingly,
+    index_N attributes that repeat the template are dropped
+    and identical values tables are shared in memory.
+
+    Return report with the following keys:
+    renamed: removed template names mapped to the names that replace them
+    templates: number of removed templates
+    indices: number of removed index_N attributes
+    tables: number of tables with values identical to some previous table
+    bytes: size saving of the dumped library
+
+    lib: merged library
+    """
+    renamed, saved = dedup_templates(lib)
+    report = {'renamed': renamed,
+              'templates': len(renamed),
+              'indices': 0,
+              'tables': 0,
+              'bytes': saved}
+
+    templates = lib.lu_table_template if hasattr(lib, 'lu_table_template') else {}
+    dedup_tables(lib, templates, renamed, {}, report)
+
+    return report
@@ -1,8 +1,19 @@
 """This module provides adjustable Liberty parser
 
     Functions for parsing:
-load() - read Liberty
+load() - read Liberty, cells of one file can be parsed in parallel processes
+load_many() - read several Liberty files in parallel processes
+set_cache() - enable on-disk cache of parsed libraries
+index() - find byte offsets of library header and its groups, used by load(filename, cells=[...])
 dump() - write Liberty
+dump_many() - write several libraries in parallel processes
+patch() - edit attributes and group names in Liberty file without parsing it
+to_json() - write JSON
+to_json_lines() - write JSON Lines with one record per cell, pin and timing arc
+preprocess(), Preprocessor - replace comments, line continuations and whitespace runs with one space
+
+Library objects can be pickled, e.g. sent to other processes or cached on disk
+Groups are pickled by their type and restored with the class currently registered for it, see group_class()
 
 -----------------------------------------------------------------------------------------------------------------------
 
@@ -10,10 +21,16 @@ dump() - write Liberty
 
 1. Groups are represented as class instances
 2. Groups's fields (attributes and nested groups) are represented as class instance's attributes
+    they are stored in a list of values with field names shared by groups with the same fields (no __dict__),
+    group.fields() returns (name, value) pairs in the order of the file
 3. Complex attributes with multiple values are represented as tuples
 4. Quoted text in complex attributes is recognized as single value; quotes are removed
 5. If the same attribute is repeated several times then the list is created
 6. For nested groups, list or dictionary is created depending on whether these groups have names
+7. Attribute names and group types are interned, equal simple attribute values read by default parser
+    and equal texts of not yet parsed attributes are one object
+8. Complex attributes and attributes with custom parse functions are kept as text while the file is loaded
+    and parsed when the field is read for the first time (attribute access, fields(), dump, to_json, pickling)
 
     Given the following Liberty file:
 library (lib) {
@@ -58,14 +75,38 @@ See GroupMeta's documentation and example of configuration file at doc/templates
 """
 
 
-from itertools import count
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from functools import partial
+from sys import intern
+import hashlib
+import io
 import json
+import mmap
+import os
+import pickle
 import re
 
 
 _CUSTOM_GROUPS = {}
 _DEFAULT_GROUPS = {}
+_VALUES = {}
+_DELIMITER = re.compile('[{};]')
+_BRACE = re.compile('[{}]')
+_BLANK = re.compile(r'(?:\s|/\*.*?\*/|\\(?=[ \t\r]*\n))+', re.DOTALL)
+_CHUNK_SIZE = 1 << 20
+_DUMP_CHUNKS = 1 << 14
+_INDEX_TOKEN = re.compile(rb'/\*.*?\*/|[{};]', re.DOTALL)
+_INDEX_SUFFIX = '.idx'
+_ATTR_NAME = re.compile(r'[^\s:(]*')
+_QUOTED_TUPLE = re.compile(r'\s*"[^"]*"\s*(?:,\s*"[^"]*"\s*)*')
+_QUOTED = re.compile(r'"([^"]*)"')
+_CACHE = {'directory': None, 'max_size': 0}
+_INDEXES = {}
+_CACHE_VERSION = 3
+_BATCHES_PER_WORKER = 4
+_PARSED_ATTRIBUTE = '_parsed_group'
+_PARSED_STATEMENT = b'\n_parsed_group : 0;\n'
+_CACHE_SUFFIX = '.pickle'
 
 
 def _isComplex(s):
@@ -74,6 +115,11 @@ def _isComplex(s):
 
 def _parse_tuple(s):
     s = s[1:-1]
+    # common forms are split in C: (a,b,c) and ("a, b", "c, d")
+    if '"' not in s:
+        return tuple(s.split(','))
+    if _QUOTED_TUPLE.fullmatch(s):
+        return tuple(_QUOTED.findall(s))
     start = 0
     inside = False
     skip = False
@@ -110,18 +156,183 @@ def _parse_attr_default(a):
     return a
 
 
+def _parse_value(func, val):
+    val = _parse_tuple(val) if _isComplex(val) else (_parse_simple(val),)
+    if func is _parse_attr_default:
+        cur_val = val
+    elif isinstance(func, tuple):
+        cur_val = tuple(f(v) for f, v in zip(func, val))
+    else:
+        try:
+            cur_val = (func(*val),)
+        except TypeError:
+            cur_val = tuple(map(func, val))
+    if len(cur_val) == 1:
+        cur_val = cur_val[0]
+    return cur_val
+
+
+class _Lazy:
+    """Raw text of attribute and its parse function, parsed when the field is read for the first time
+
+    raw is the text of a single attribute or list of texts of the repeated one
+    """
+    __slots__ = ('func', 'raw')
+
+    def __init__(self, func, raw):
+        self.func = func
+        self.raw = raw
+
+    def add(self, raw):
+        if isinstance(self.raw, list):
+            self.raw.append(raw)
+        else:
+            self.raw = [self.raw, raw]
+
+    def parse(self):
+        if not isinstance(self.raw, list):
+            return _parse_value(self.func, self.raw)
+        value = None
+        for raw in self.raw:
+            cur_val = _parse_value(self.func, raw)
+            if value is None:
+                value = cur_val
+            elif isinstance(value, list):
+                value.append(cur_val)
+            else:
+                value = [value, cur_val]
+        return value
+
+
+def _default_group_class(type_):
+    Group = _DEFAULT_GROUPS.get(type_)
+    if Group is None:
+        Group = type(type_, (_LibertyGroup,), {'__slots__': (),
+                                               '_name': type_,
+                                               '_parse_flags': (1, 1),
+                                               '_parse_functions': {}})
+        _DEFAULT_GROUPS[type_] = Group
+    return Group
+
+
 def _parse_group_default(type_, name, attrs_gen):
-    Group = _DEFAULT_GROUPS.get(type_,
-                                type(type_, (_LibertyGroup,), {'_name': type_,
-                                                               '_parse_flags': (1, 1),
-                                                               '_parse_functions': {}}))
-    _DEFAULT_GROUPS[type_] = Group
-    return Group(name, attrs_gen)
+    return _default_group_class(type_)(name, attrs_gen)
+
+
+def group_class(type_: str, custom: bool = True) -> type:
+    """Return class used for groups of type_: custom class if it is registered, default class otherwise
+
+    Group classes are generated at runtime, so groups are pickled by their type and restored with this registry
+    """
+    cls = _CUSTOM_GROUPS.get(type_) if custom else None
+    return cls if cls is not None else _default_group_class(type_)
+
+
+def _restore_group(type_, custom):
+    return _LibertyGroup.__new__(group_class(type_, custom))
+
+
+class _Shape:
+    """Names of fields stored by a group in their order, shared by all groups with the same fields
+
+    Adding a field moves the group to the next shape, shapes are created once and reused
+    """
+    __slots__ = ('keys', 'index', 'next')
+
+    def __init__(self, keys):
+        self.keys = keys
+        self.index = {n: i for i, n in enumerate(keys)}
+        self.next = {}
+
+    def add(self, name):
+        shape = self.next.get(name)
+        if shape is None:
+            shape = self.next[name] = _Shape(self.keys + (name,))
+        return shape
+
+
+_EMPTY_SHAPE = _Shape(())
+
+
+def _shape_of(keys):
+    shape = _EMPTY_SHAPE
+    for n in keys:
+        shape = shape.add(n)
+    return shape
+
+
+def _render_attrs(out, indent, n, as_):
+    head = indent + n
+    separator = None
+    for a in as_:
+        if isinstance(a, tuple):
+            if ',' in a[0]:
+                if separator is None:
+                    separator = '", \\\n' + indent + ' ' * len(n) + ' \t "'
+                out.append(head + ' \t("' + separator.join(map(format, a)) + '");\n')
+            else:
+                out.append(head + ' \t(' + ','.join(map(format, a)) + ');\n')
+        else:
+            out.append(head + ' : ' + format(a) + ';\n')
 
 
 class _LibertyGroup:
+    """Base class of groups
+
+    Fields (attributes and nested groups) are kept in a list of values with a _Shape shared by groups
+        which have the same field names, not in per-instance dictionaries
+    Fields are read and written as instance attributes, fields() returns them in the order they were added
+    """
+    __slots__ = ('name', '_shape', '_values')
+
     _ATTRIBUTE = 0
     _GROUP = 1
+    _PARSED_GROUP = 2
+
+    def __new__(cls, *args, **kwargs):
+        obj = object.__new__(cls)
+        _set_shape(obj, _EMPTY_SHAPE)
+        _set_values(obj, [])
+        return obj
+
+    def __getattr__(self, name):
+        if name in _LibertyGroup.__slots__:
+            raise AttributeError(name)
+        i = self._shape.index.get(name)
+        if i is None:
+            raise AttributeError(f"'{type(self).__name__}' group has no field '{name}'")
+        value = self._values[i]
+        if type(value) is _Lazy:
+            value = self._values[i] = value.parse()
+        return value
+
+    def __setattr__(self, name, value):
+        if name in _LibertyGroup.__slots__:
+            object.__setattr__(self, name, value)
+            return
+        i = self._shape.index.get(name)
+        if i is None:
+            _set_shape(self, self._shape.add(name))
+            self._values.append(value)
+        else:
+            self._values[i] = value
+
+    def __delattr__(self, name):
+        i = self._shape.index.get(name)
+        if i is None:
+            object.__delattr__(self, name)
+            return
+        keys = self._shape.keys
+        _set_shape(self, _shape_of(keys[:i] + keys[i + 1:]))
+        del self._values[i]
+
+    def fields(self) -> list:
+        """Return list of (name, value) pairs of group's attributes and nested groups in the order they were added"""
+        values = self._values
+        for i, value in enumerate(values):
+            if type(value) is _Lazy:
+                values[i] = value.parse()
+        return list(zip(self._shape.keys, values))
 
     def _try_add_prop(self, name, val):
         func = self._parse_functions.get(name)
@@ -130,49 +341,66 @@ class _LibertyGroup:
                 return
         elif func is None:
             func = self._parse_functions.get('default', _parse_attr_default)
-        val = _parse_tuple(val) if _isComplex(val) else (_parse_simple(val),)
-        if isinstance(func, tuple):
-            cur_val = tuple(f(v) for f, v in zip(func, val))
+
+        i = self._shape.index.get(name)
+        prev_val = None if i is None else self._values[i]
+        if type(prev_val) is _Lazy:
+            prev_val.add(_VALUES.setdefault(val, val))
+            return
+        if func is _parse_attr_default and not _isComplex(val):
+            cur_val = _parse_simple(val)
+            cur_val = _VALUES.setdefault(cur_val, cur_val)
+        elif prev_val is None:
+            cur_val = _Lazy(func, _VALUES.setdefault(val, val))
         else:
-            try:
-                cur_val = (func(*val),)
-            except TypeError:
-                cur_val = tuple(map(func, val))
-        if len(cur_val) == 1:
-            cur_val = cur_val[0]
-
-        prev_val = self.__dict__.get(name)
-        if prev_val is None:
-            self.__dict__[name] = cur_val
+            cur_val = _parse_value(func, val)
+
+        if i is None:
+            _set_shape(self, self._shape.add(name))
+            self._values.append(cur_val)
         elif isinstance(prev_val, list):
             prev_val.append(cur_val)
         else:
-            self.__dict__[name] = [prev_val, cur_val]
+            self._values[i] = [prev_val, cur_val]
 
-    def _try_add_group(self, group, name, attrs_gen):
-        cls = _CUSTOM_GROUPS.get(group)
-        if not (self._parse_flags[1] or group in self._fields):
-            if cls is None or not self._parse_flags[2]:
-                self._skip(attrs_gen)
-                return
-        elif not cls:
-            cls = partial(_parse_group_default, group)
+    @classmethod
+    def _group_parser(cls, group):
+        """Return class for nested groups of type group, None if they are skipped"""
+        parser = _CUSTOM_GROUPS.get(group)
+        if not (cls._parse_flags[1] or group in cls._fields):
+            if parser is None or not cls._parse_flags[2]:
+                return None
+        elif not parser:
+            parser = partial(_parse_group_default, group)
+        return parser
 
-        group_obj = cls(name, attrs_gen)
+    def _try_add_group(self, group, name, attrs_gen):
+        cls = self._group_parser(group)
+        if cls is None:
+            self._skip(attrs_gen)
+            return
+        self._add_group(group, name, cls(name, attrs_gen))
+
+    def _add_group(self, group, name, group_obj):
+        i = self._shape.index.get(group)
+        if i is None:
+            _set_shape(self, self._shape.add(group))
+            self._values.append({} if name else [])
+            i = len(self._values) - 1
         if name:
-            if group not in self.__dict__:
-                self.__dict__[group] = {}
-            self.__dict__[group][name] = group_obj
+            self._values[i][name] = group_obj
         else:
-            if group not in self.__dict__:
-                self.__dict__[group] = []
-            self.__dict__[group].append(group_obj)
+            self._values[i].append(group_obj)
 
         if group in self._parse_functions:
             self._parse_functions[group](self, name, group_obj)
 
     @classmethod
     def _skip(cls, attrs_gen):
+        skip_group = getattr(attrs_gen, 'skip_group', None)
+        if skip_group is not None:
+            skip_group()
+            return
         for type_, name, val in attrs_gen:
             if type_ == cls._ATTRIBUTE:
                 continue
@@ -184,56 +412,63 @@ class _LibertyGroup:
     def __init__(self, name: str, attrs_gen: 'generator'):
         """Generator must yield 3 values: type, name and value
             type is 0 for attribute and 1 for group
+                2 for group parsed elsewhere, then value is (group's name, group instance), None if it is skipped
             name is property's name or group's type
             value is property's value or group's name
         """
-        self.name = name
+        _set_name(self, name)
 
         for type_, name, val in attrs_gen:
             if type_ == self._ATTRIBUTE:
                 self._try_add_prop(name, val)
             elif type_ == self._GROUP:
                 self._try_add_group(name, val, attrs_gen)
+            elif type_ == self._PARSED_GROUP:
+                if val is not None:
+                    self._add_group(name, *val)
             else:
                 break
 
     def __str__(self):
         return self.name
 
+    def __reduce__(self):
+        return _restore_group, (self._name, isinstance(type(self), GroupMeta)), \
+            (getattr(self, 'name', None), self._shape.keys, [a for _, a in self.fields()])
+
+    def __setstate__(self, state):
+        name, keys, values = state
+        _set_name(self, name)
+        _set_shape(self, _shape_of(keys))
+        _set_values(self, list(values))
+
     def dump(self, f: 'file', indent: str) -> None:
-        opener = indent + '{} ({})'.format(self._name, self.name) + ' {\n'
-        closer = indent + '}\n'
-        indent = indent + ' ' * 2
-        
-        def dump_groups(gs):
-            for g in gs:
-                g.dump(f, indent)
-        
-        def dump_attrs(n, as_):
-            for a in as_:
-                if isinstance(a, tuple):
-                    fmtstr = indent + '{} \t(' + \
-                             ((', \\\n' + indent + ' ' * len(n) + ' \t ').join(['"{}"'] * len(a)) if ',' in a[0]
-                              else ','.join(['{}'] * len(a))) + ');\n'
-                else:
-                    fmtstr = indent + '{} : {};\n'
-                    a = (a,)
-                f.write(fmtstr.format(n, *a))
-        
-        f.write(opener)
-        for n, a in self.__dict__.items():
+        out = []
+        self._render(out, indent, f)
+        f.write(''.join(out))
+
+    def _render(self, out, indent, f):
+        """Append dumped text to out, write it to f in large blocks"""
+        out.append(indent + '{} ({})'.format(self._name, self.name) + ' {\n')
+        inner = indent + '  '
+        for n, a in self.fields():
             if n.startswith('_') or callable(a) or n == 'name':
                 continue
             if isinstance(a, dict):
-                dump_groups(a.values())
+                for g in a.values():
+                    g._render(out, inner, f)
             elif isinstance(a, list):
                 if isinstance(a[0], _LibertyGroup):
-                    dump_groups(a)
+                    for g in a:
+                        g._render(out, inner, f)
                 else:
-                    dump_attrs(n, a)
+                    _render_attrs(out, inner, n, a)
             else:
-                dump_attrs(n, [a])
-        f.write(closer)
+                _render_attrs(out, inner, n, (a,))
+        out.append(indent + '}\n')
+        if len(out) >= _DUMP_CHUNKS:
+            f.write(''.join(out))
+            out.clear()
 
     def to_json_dict(self, convert_numerics=True):
         d = {}
@@ -262,13 +497,18 @@ class _LibertyGroup:
             else:
                 return str(v)
 
-        for n, a in self.__dict__.items():
+        for n, a in self.fields():
             if n.startswith('_') or callable(a) or n == 'name':
                 continue
             d[n] = convert(a)
         return d
 
 
+_set_name = _LibertyGroup.name.__set__
+_set_shape = _LibertyGroup._shape.__set__
+_set_values = _LibertyGroup._values.__set__
+
+
 class GroupMeta(type):
     """Metaclass for creating custom group classes
 
@@ -357,6 +597,8 @@ class GroupMeta(type):
     name is current group's name
     gen is generator used internally for further initialization
         alternating gen or exhausting it will cause errors in parser's work
+    attributes set on self are stored as group's fields, groups have no __dict__,
+        so class attributes and methods of the same name take precedence when they are read
 
     -------------------------------------------------------------------------------------------------------------------
 
@@ -404,6 +646,7 @@ class GroupMeta(type):
 
         class_name = attrs.pop('class_name') if 'class_name' in attrs else name
         attrs['_name'] = name
+        attrs.setdefault('__slots__', ())
 
         bases = (_LibertyGroup,) + bases
         group = type.__new__(mcs, class_name, bases, attrs)
@@ -429,57 +672,596 @@ def set_default_parser() -> None:
     _CUSTOM_GROUPS.clear()
 
 
-def load(filename: str) -> 'library':
-    """Parse file in Liberty format, return library instance"""
-    with open(filename) as library_file:
-        library_string = library_file.read()
+class Preprocessor:
+    """Single pass Liberty preprocessor: comments, line continuations and whitespace runs become one space
+
+    Line continuation is a backslash followed by a line break, other backslashes are kept
+    Text may be given at once with preprocess() or in chunks with feed() and finish(),
+        the end of a chunk which may continue in the next one is kept back, so the result is the same
+    """
+    def __init__(self):
+        self._tail = ''
+
+    def feed(self, chunk: str) -> str:
+        """Add next chunk of text, return preprocessed text which can not change with the following chunks"""
+        text = self._tail + chunk
+        cut = len(text)
+        comment_end = 0
+        comments = {}
+        start = text.find('/*')
+        while start != -1:
+            end = text.find('*/', start + 2)
+            if end == -1:
+                cut = start
+                break
+            comment_end = end + 2
+            comments[comment_end] = start
+            start = text.find('/*', comment_end)
+
+        if cut == len(text) and cut != comment_end and text.endswith('/'):
+            cut -= 1
+        while cut:
+            if text[cut - 1].isspace() or text[cut - 1] == '\\':
+                cut -= 1
+            elif cut in comments:
+                cut = comments[cut]
+            else:
+                break
+
+        self._tail = text[cut:]
+        return _BLANK.sub(' ', text[:cut])
+
+    def finish(self) -> str:
+        """Return preprocessed rest of the text"""
+        text, self._tail = self._tail, ''
+        return _BLANK.sub(' ', text)
+
+
+def preprocess(text: str) -> str:
+    """Return Liberty text with comments, line continuations and whitespace runs replaced by one space"""
+    return _BLANK.sub(' ', text)
+
+
+def _read_clean(library_file, chunk_size=_CHUNK_SIZE):
+    """Read file in chunks, yield preprocessed text"""
+    preprocessor = Preprocessor()
+    for chunk in iter(partial(library_file.read, chunk_size), ''):
+        yield preprocessor.feed(chunk)
+    yield preprocessor.finish()
 
-    library_string = re.sub('\w*\\\w*', '', library_string)
-    library_string = re.sub('\s+', ' ', library_string)
-    comment = re.compile('/\*.*?\*/')
-    library_string = comment.sub('', library_string)
 
-    def parse_attr(s):
+class _FileRanges(io.RawIOBase):
+    """Binary file reader which returns only the given (start, end) byte ranges of the file, one after another
+
+    Bytes objects given instead of ranges are returned as they are
+    """
+    def __init__(self, f, ranges):
+        self._file = f
+        self._ranges = list(ranges)
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while self._ranges:
+            if isinstance(self._ranges[0], bytes):
+                data = self._ranges[0]
+                n = min(len(b), len(data))
+                b[:n] = data[:n]
+                if n < len(data):
+                    self._ranges[0] = data[n:]
+                else:
+                    self._ranges.pop(0)
+                return n
+            start, end = self._ranges[0]
+            if start >= end:
+                self._ranges.pop(0)
+                continue
+            self._file.seek(start)
+            n = self._file.readinto(memoryview(b)[:end - start])
+            self._ranges[0] = (start + n, end)
+            return n
+        return 0
+
+
+def _file_hash(filename):
+    digest = hashlib.sha1()
+    with open(filename, 'rb') as f:
+        for chunk in iter(partial(f.read, _CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _build_index(filename):
+    """Return byte offsets of the library group and of its nested groups
+
+    library - [start, end] of the library group
+    header - [start, end] of the library text before the first cell
+    groups - [type, name, start, end] of each group nested in library, start is the end of previous statement
+    """
+    idx = {'library': None, 'header': None, 'groups': []}
+    if os.path.getsize(filename) == 0:
+        return idx
+
+    with open(filename, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        depth = 0
+        last = 0
+        start = 0
+        type_ = name = None
+        for match in _INDEX_TOKEN.finditer(buffer):
+            token = match.group()
+            if token == b'{':
+                if depth == 0:
+                    start = last
+                elif depth == 1:
+                    statement = buffer[last:match.start()].decode(errors='replace')
+                    type_, _, name = statement.partition('(')
+                    type_ = type_.strip()
+                    name = name[:name.rfind(')')].replace('"', '').strip()
+                    if type_ == 'cell' and idx['header'] is None:
+                        idx['header'] = [start, last]
+                    group_start = last
+                depth += 1
+            elif token == b'}':
+                depth -= 1
+                if depth == 1:
+                    idx['groups'].append([type_, name, group_start, match.end()])
+                elif depth == 0:
+                    idx['library'] = [start, match.end()]
+                    if idx['header'] is None:
+                        idx['header'] = [start, match.start()]
+                    break
+            last = match.end()
+
+    return idx
+
+
+def index(filename: str) -> dict:
+    """Return byte offsets of library header and its nested groups (lu_table_template, cell, ...)
+
+    Index is kept in memory and, if cache is enabled with set_cache(), in the cache directory
+        nothing is written next to the file; index is rebuilt when the file's size or content changes
+    """
+    stat = os.stat(filename)
+    path = os.path.abspath(filename)
+    idx = _INDEXES.get(path)
+    stored = None
+    if idx is None and _CACHE['directory'] is not None:
+        stored = os.path.join(_CACHE['directory'], hashlib.sha1(path.encode()).hexdigest() + _INDEX_SUFFIX)
         try:
-            name, val = s.split(':', maxsplit=1)
-        except ValueError:
-            lb = s.find('(')
-            rb = s.find(')')
-            name = s[:lb]
-            val = s[lb:rb + 1]
-        return 0, name.strip(), val.strip()
-
-    def parse_group(s):
-        s = s[:-1].strip()
+            with open(stored) as f:
+                idx = json.load(f)
+        except (OSError, ValueError):
+            idx = None
+
+    if idx is not None and idx.get('size') == stat.st_size:
+        if idx.get('mtime_ns') == stat.st_mtime_ns:
+            _INDEXES[path] = idx
+            return idx
+        if idx.get('sha1') == _file_hash(filename):
+            idx['mtime_ns'] = stat.st_mtime_ns
+            _store_index(path, stored, idx)
+            return idx
+
+    idx = _build_index(filename)
+    idx.update(size=stat.st_size, mtime_ns=stat.st_mtime_ns, sha1=_file_hash(filename))
+    _store_index(path, stored, idx)
+    return idx
+
+
+def _store_index(path, stored, idx):
+    _INDEXES[path] = idx
+    if stored is None:
+        return
+    try:
+        with open(stored, 'w') as f:
+            json.dump(idx, f)
+    except OSError:
+        pass
+
+
+def _parse_attr_event(s):
+    try:
+        name, val = s.split(':', maxsplit=1)
+    except ValueError:
         lb = s.find('(')
-        return 1, s[:lb].strip(), s[lb + 1:-1].strip().replace('"','')
+        rb = s.find(')')
+        name = s[:lb]
+        val = s[lb:rb + 1]
+    return 0, intern(name.strip()), val.strip()
 
-    pos = 0
 
-    def generate():
-        nonlocal pos
-        for nextpos in count(start=pos):
-            if nextpos == len(library_string):
-                return
-            ch = library_string[nextpos]
+def _parse_group_event(s):
+    s = s[:-1].strip()
+    lb = s.find('(')
+    return 1, intern(s[:lb].strip()), s[lb + 1:-1].strip().replace('"','')
+
+
+class _Events:
+    """Iterator over (type, name, value) events of preprocessed Liberty text given in pieces
+
+    skip_group() jumps to the end of the current group by matching braces, without producing its events
+    """
+    def __init__(self, pieces):
+        self._pieces = pieces
+        self._text = ''
+        self._pos = 0
+        self._matches = iter(())
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        while True:
+            match = next(self._matches, None)
+            if match is None:
+                self._text = self._text[self._pos:] + next(self._pieces)
+                self._pos = 0
+                self._matches = _DELIMITER.finditer(self._text)
+                continue
+
+            ch = match.group()
+            pos = self._pos
+            nextpos = match.start()
+            self._pos = nextpos + 1
             if ch == '}':
-                yield -1, -1, -1
-                pos = nextpos + 1
+                return -1, -1, -1
             elif ch == '{':
-                yield parse_group(library_string[pos:nextpos])
-                pos = nextpos + 1
-            elif ch == ';':
-                yield parse_attr(library_string[pos:nextpos])
-                pos = nextpos + 1
+                return _parse_group_event(self._text[pos:nextpos])
+            else:
+                return _parse_attr_event(self._text[pos:nextpos])
+
+    def skip_group(self):
+        depth = 1
+        while True:
+            for match in _BRACE.finditer(self._text, self._pos):
+                depth += 1 if match.group() == '{' else -1
+                if depth == 0:
+                    self._pos = match.end()
+                    self._matches = _DELIMITER.finditer(self._text, self._pos)
+                    return
+            self._text = next(self._pieces, None)
+            self._pos = 0
+            if self._text is None:
+                self._text = ''
+                self._matches = iter(())
+                return
 
-    gen = generate()
 
-    for type_, name, val in gen:
-        if type_ == 1:
-            if name in _CUSTOM_GROUPS:
-                return _CUSTOM_GROUPS[name](val, gen)
-            elif name == 'library':
-                return _parse_group_default(name, val, gen)
+class _Reassembled:
+    """Events of library text where groups parsed elsewhere are replaced by _PARSED_STATEMENT
+
+    Each such statement is turned into event of type 2 with the next of (type, name, instance) parsed groups
+    """
+    def __init__(self, events, parsed):
+        self._events = events
+        self._parsed = parsed
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        event = next(self._events)
+        if event[0] == 0 and event[1] == _PARSED_ATTRIBUTE:
+            type_, name, group = next(self._parsed)
+            return 2, type_, None if group is None else (name, group)
+        return event
+
+    def skip_group(self):
+        self._events.skip_group()
+
+
+def _parse(library_file, wrap=None):
+    gen = _Events(_read_clean(library_file))
+    if wrap is not None:
+        gen = wrap(gen)
+
+    try:
+        for type_, name, val in gen:
+            if type_ == 1:
+                if name in _CUSTOM_GROUPS:
+                    return _CUSTOM_GROUPS[name](val, gen)
+                elif name == 'library':
+                    return _parse_group_default(name, val, gen)
+    finally:
+        _VALUES.clear()
+
+
+def set_cache(directory: str = None, max_size: int = 1 << 30) -> None:
+    """Keep parsed libraries in directory and reuse them in load(), None disables the cache
+
+    Cache entries are keyed by file path, size, mtime, content hash, requested cells and current customization
+    Least recently used entries are removed when total size of the cache exceeds max_size bytes
+    Byte offsets from index() are kept in the same directory
+    """
+    _CACHE['directory'] = directory
+    _CACHE['max_size'] = max_size
+    if directory is not None:
+        os.makedirs(directory, exist_ok=True)
+
+
+def _customization_key():
+    def describe(f):
+        if isinstance(f, tuple):
+            return tuple(describe(ff) for ff in f)
+        return getattr(f, '__module__', ''), getattr(f, '__qualname__', repr(f))
+
+    return sorted((type_, cls.__module__, cls.__qualname__, sorted(cls._fields), cls._parse_flags,
+                   sorted((n, describe(f)) for n, f in cls._parse_functions.items()))
+                  for type_, cls in _CUSTOM_GROUPS.items())
+
+
+def _cache_path(filename, cells):
+    stat = os.stat(filename)
+    key = (_CACHE_VERSION, os.path.abspath(filename), stat.st_size, stat.st_mtime_ns, _file_hash(filename),
+           sorted(cells) if cells is not None else None, _customization_key())
+    return os.path.join(_CACHE['directory'], hashlib.sha1(repr(key).encode()).hexdigest() + _CACHE_SUFFIX)
+
+
+def _cache_store(path, lib):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(lib, f, pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+    entries = []
+    for entry in os.scandir(_CACHE['directory']):
+        if entry.name.endswith(_CACHE_SUFFIX) and entry.path != path:
+            stat = entry.stat()
+            entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+    total = os.path.getsize(path) + sum(size for _, size, _ in entries)
+    for _, size, entry_path in sorted(entries):
+        if total <= _CACHE['max_size']:
+            break
+        try:
+            os.remove(entry_path)
+        except OSError:
+            continue
+        total -= size
+
+
+def load(filename: str, cells: 'iterable' = None, workers: int = 1) -> 'library':
+    """Parse file in Liberty format, return library instance
+
+    File is read and tokenized in chunks, memory used for the text doesn't depend on file size
+    If cells are given, only these cells are parsed along with the rest of the library (header, templates, etc.)
+        other cells are skipped using byte offsets from index()
+    If workers > 1, cells are parsed in a pool of workers processes using byte offsets from index()
+        the rest of the library is parsed in this process, customization must be imported before the call
+    If cache is enabled with set_cache(), library is taken from the cache when the file is unchanged
+    """
+    if _CACHE['directory'] is None:
+        return _load(filename, cells, workers)
+
+    path = _cache_path(filename, cells)
+    try:
+        with open(path, 'rb') as f:
+            lib = pickle.load(f)
+        os.utime(path)
+        return lib
+    except Exception:
+        pass
+
+    lib = _load(filename, cells, workers)
+    _cache_store(path, lib)
+    return lib
+
+
+def _load(filename, cells, workers=1):
+    if workers > 1:
+        return _load_parallel(filename, cells, workers)
+    if cells is None:
+        with open(filename) as library_file:
+            return _parse(library_file)
+
+    cells = set(cells)
+    idx = index(filename)
+    if idx['library'] is None:
+        return None
+
+    ranges = []
+    pos, library_end = idx['library']
+    for type_, name, start, end in idx['groups']:
+        if type_ == 'cell' and name not in cells:
+            ranges.append((pos, start))
+            pos = end
+    ranges.append((pos, library_end))
+
+    with open(filename, 'rb') as raw, io.TextIOWrapper(io.BufferedReader(_FileRanges(raw, ranges))) as library_file:
+        return _parse(library_file)
+
+
+def _parse_groups(filename, ranges):
+    """Parse groups nested in library from byte ranges of the file, return list of (type, name, instance)
+
+    Instance is None if library doesn't parse groups of this type
+    """
+    library = group_class('library')
+    groups = []
+    with open(filename, 'rb') as raw, io.TextIOWrapper(io.BufferedReader(_FileRanges(raw, ranges))) as library_file:
+        gen = _Events(_read_clean(library_file))
+        try:
+            for type_, name, val in gen:
+                if type_ == 1:
+                    cls = library._group_parser(name)
+                    if cls is None:
+                        library._skip(gen)
+                        groups.append((name, val, None))
+                    else:
+                        groups.append((name, val, cls(val, gen)))
+        finally:
+            _VALUES.clear()
+    return groups
+
+
+def _batches(groups, count):
+    """Split groups into at most count runs of consecutive groups of about equal size in bytes"""
+    total = sum(end - start for _, _, start, end in groups)
+    batches = [[]]
+    size = 0
+    for group in groups:
+        if size >= total * len(batches) / count:
+            batches.append([])
+        batches[-1].append(group)
+        size += group[3] - group[2]
+    return batches
+
+
+def _load_parallel(filename, cells, workers):
+    """Parse cells in a pool of workers processes and the rest of the library in this process
+
+    Cells are split into runs of consecutive cells, the library is reassembled with cells in the order of the file
+    """
+    idx = index(filename)
+    if idx['library'] is None:
+        return None
+
+    cells = set(cells) if cells is not None else None
+    ranges = []
+    parsed = []
+    pos, library_end = idx['library']
+    for group in idx['groups']:
+        type_, name, start, end = group
+        if type_ == 'cell':
+            ranges.append((pos, start))
+            pos = end
+            if cells is None or name in cells:
+                ranges.append(_PARSED_STATEMENT)
+                parsed.append(group)
+    ranges.append((pos, library_end))
+    if len(parsed) < 2:
+        return _load(filename, cells)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_parse_groups, filename, [(start, end) for _, _, start, end in batch])
+                   for batch in _batches(parsed, workers * _BATCHES_PER_WORKER)]
+        groups = (group for future in futures for group in future.result())
+        with open(filename, 'rb') as raw, \
+                io.TextIOWrapper(io.BufferedReader(_FileRanges(raw, ranges))) as library_file:
+            return _parse(library_file, lambda events: _Reassembled(events, groups))
+
+
+def _load_completed(filenames, workers):
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(load, filename): filename for filename in filenames}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+
+def load_many(filenames: 'iterable', workers: int = 1, completed: bool = False) -> 'list':
+    """Parse several files in Liberty format, return list of library instances in the order of filenames
+
+    Files are parsed in a pool of workers processes, workers=1 parses them one by one in this process
+    Customization must be imported before the call, forked workers inherit it
+    If completed is True then generator of (filename, library) pairs is returned,
+        libraries are yielded as soon as they are parsed
+    """
+    filenames = list(filenames)
+    if workers > 1 and len(filenames) > 1:
+        if completed:
+            return _load_completed(filenames, workers)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(load, filenames))
+
+    if completed:
+        return ((filename, load(filename)) for filename in filenames)
+    return [load(filename) for filename in filenames]
+
+
+def _parse_selector(selector):
+    type_, _, name = selector.partition('(')
+    return type_.strip(), name[:name.rfind(')')].replace('"', '').strip() if name else None
+
+
+def _path_match(selectors, stack):
+    if len(selectors) > len(stack):
+        return False
+    for (type_, name), (group_type, group_name) in zip(selectors, stack[len(stack) - len(selectors):]):
+        if type_ != group_type or (name is not None and name != group_name):
+            return False
+    return True
+
+
+def _patch_changes(buffer, edits):
+    """Scan the file once, return list of (start, end, text) changes for the edits"""
+    edits = [(edit[0], [_parse_selector(selector) for selector in edit[1]]) + tuple(edit[2:]) for edit in edits]
+    changes = []
+    stack = []
+    last = 0
+    for match in _INDEX_TOKEN.finditer(buffer):
+        token = match.group()
+        if token.startswith(b'/*'):
+            last = match.end()
+            continue
+
+        statement = buffer[last:match.start()]
+        start = last + len(statement) - len(statement.lstrip())
+        text = statement.decode(errors='replace').strip()
+
+        if token == b'{':
+            type_, name = _parse_selector(text)
+            stack.append((type_, name))
+            for edit in edits:
+                if edit[0] == 'rename' and _path_match(edit[1], stack):
+                    lb = statement.find(b'(')
+                    rb = statement.rfind(b')')
+                    quote = '"' if statement[lb + 1:rb].strip().startswith(b'"') else ''
+                    changes.append((last + lb + 1, last + rb, quote + edit[2] + quote))
+        elif token == b'}':
+            if stack:
+                stack.pop()
+        else:
+            name = _ATTR_NAME.match(text).group()
+            for edit in edits:
+                if edit[0] == 'rename' or edit[2] != name or not _path_match(edit[1], stack):
+                    continue
+                if edit[0] == 'set':
+                    separator = ' : ' if ':' in text else ' '
+                    changes.append((start, match.end(), name + separator + edit[3] + ';'))
+                elif edit[0] == 'insert':
+                    line = buffer[buffer.rfind(b'\n', 0, start) + 1:start].decode(errors='replace')
+                    indent = line[:len(line) - len(line.lstrip())]
+                    lines = [edit[3]] if isinstance(edit[3], str) else edit[3]
+                    changes.append((match.end(), match.end(), ''.join('\n' + indent + item for item in lines)))
+        last = match.end()
+
+    changes.sort(key=lambda change: change[0])
+    return changes
+
+
+def patch(filename: str, edits: 'list', out_filename: str = None) -> int:
+    """Apply edits to Liberty file without parsing it, return number of changes
+
+    File is scanned once for group headers and attribute statements, then copied with the changes
+    Result is written to out_filename or replaces the file
+    Edits are tuples:
+        ('set', path, attribute, value)     - replace value of the attribute, value is the text after 'attribute :'
+                                              or after 'attribute' for complex attributes, e.g. '("1, 2")'
+        ('insert', path, attribute, text)   - insert statement after the attribute on a new line with the same indent,
+                                              text may be a list of lines
+        ('rename', path, name)              - rename group
+    path is tuple of group selectors 'type' or 'type(name)', it is matched against the end of group nesting:
+        ('library',) - library level, ('cell(INV_X1)', 'pin') - every pin of INV_X1,
+        ('rise_constraint(%sample%)',) - every rise_constraint group named %sample% at any depth
+    """
+    with open(filename, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        changes = _patch_changes(buffer, edits)
+        out_path = out_filename if out_filename is not None else filename + '.tmp'
+        with open(out_path, 'wb', buffering=_CHUNK_SIZE) as out, memoryview(buffer) as view:
+            pos = 0
+            count = 0
+            for start, end, text in changes:
+                if start < pos:
+                    continue
+                out.write(view[pos:start])
+                out.write(text.encode())
+                pos = end
+                count += 1
+            out.write(view[pos:])
+
+    if out_filename is None:
+        os.replace(out_path, filename)
+    return count
 
 
 def dump(lib: 'library', filename: str) -> None:
@@ -489,19 +1271,152 @@ def dump(lib: 'library', filename: str) -> None:
         lib.dump(f, '')
 
 
+def dump_many(libs: 'iterable', filenames: 'iterable', workers: int = 1) -> None:
+    """Write libraries to files, in a pool of workers processes if workers > 1"""
+    libs = list(libs)
+    filenames = list(filenames)
+    if workers > 1 and len(libs) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(dump, libs, filenames))
+    else:
+        for lib, filename in zip(libs, filenames):
+            dump(lib, filename)
+
+
+def _json_number(s):
+    try:
+        return float(s)
+    except ValueError:
+        return s
+
+
+def _json_fields(group, skip=()):
+    for n, a in group.fields():
+        if n.startswith('_') or callable(a) or n == 'name' or n in skip:
+            continue
+        yield n, a
+
+
+def _write_json_items(out, f, items, convert_attr):
+    out.append('{')
+    first = True
+    for k, v in items:
+        if not first:
+            out.append(', ')
+        first = False
+        out.append(json.dumps(k) + ': ')
+        _write_json(out, f, v, convert_attr)
+    out.append('}')
+
+
+def _write_json(out, f, v, convert_attr):
+    """Append JSON of the value to out the same way as json.dump(to_json_dict()), write it to f in large blocks"""
+    if isinstance(v, str):
+        out.append(json.dumps(convert_attr(v)))
+    elif isinstance(v, (list, tuple, set)):
+        out.append('[')
+        for i, item in enumerate(v):
+            if i:
+                out.append(', ')
+            _write_json(out, f, item, convert_attr)
+        out.append(']')
+    elif isinstance(v, dict):
+        _write_json_items(out, f, v.items(), convert_attr)
+    elif isinstance(v, _LibertyGroup):
+        # nested groups are converted with default settings, as in to_json_dict
+        _write_json_items(out, f, _json_fields(v), _json_number)
+        if len(out) >= _DUMP_CHUNKS:
+            f.write(''.join(out))
+            out.clear()
+    elif hasattr(v, 'to_json_dict'):
+        out.append(json.dumps(v.to_json_dict()))
+    else:
+        out.append(json.dumps(str(v)))
+
+
 def to_json(*libs: 'library', filename: str, convert_numerics=True) -> None:
-    """Write JSON file"""
+    """Write JSON file
+
+    JSON is written while walking the libraries, the whole document is never built in memory
+    """
     names = set()
     duplicate_names = set()
     for lib in libs:
         (duplicate_names if lib.name in names else names).add(lib.name)
 
-    d = {'library': {name: [] for name in duplicate_names}}
-    for lib in libs:
-        if lib.name in duplicate_names:
-            d['library'][lib.name].append(lib.to_json_dict(convert_numerics))
-        else:
-            d['library'][lib.name] = lib.to_json_dict(convert_numerics)
+    convert_attr = _json_number if convert_numerics else lambda s: s
+    items = [(name, [lib for lib in libs if lib.name == name]) for name in duplicate_names]
+    items += [(lib.name, lib) for lib in libs if lib.name not in duplicate_names]
+
+    def write_lib(out, f, lib):
+        _write_json_items(out, f, _json_fields(lib), convert_attr)
+
+    with open(filename, 'w') as f:
+        out = ['{"library": {']
+        for i, (name, value) in enumerate(items):
+            if i:
+                out.append(', ')
+            out.append(json.dumps(name) + ': ')
+            if isinstance(value, list):
+                out.append('[')
+                for j, lib in enumerate(value):
+                    if j:
+                        out.append(', ')
+                    write_lib(out, f, lib)
+                out.append(']')
+            else:
+                write_lib(out, f, value)
+        out.append('}}')
+        f.write(''.join(out))
+
+
+def _json_record(convert_attr, group, skip=(), **keys):
+    record = dict(keys)
+    record.update((n, _json_value(a, convert_attr)) for n, a in _json_fields(group, skip))
+    return json.dumps(record) + '\n'
+
+
+def _json_value(v, convert_attr):
+    if isinstance(v, str):
+        return convert_attr(v)
+    elif isinstance(v, (list, tuple, set)):
+        return [_json_value(item, convert_attr) for item in v]
+    elif isinstance(v, dict):
+        return {k: _json_value(vv, convert_attr) for k, vv in v.items()}
+    elif hasattr(v, 'to_json_dict'):
+        return v.to_json_dict()
+    else:
+        return str(v)
+
+
+def _group_items(group, type_):
+    a = getattr(group, type_, ())
+    return a.items() if isinstance(a, dict) else enumerate(a)
+
+
+def to_json_lines(*libs: 'library', filename: str, convert_numerics=True) -> None:
+    """Write JSON Lines file with one record per cell, pin and timing arc
+
+    Each record has 'record' type and names of the enclosing library, cell, bus and pin
+        followed by the group's fields except the nested groups which have their own records
+    Timing arcs are numbered in their pin by 'timing' key
+    """
+    convert_attr = _json_number if convert_numerics else lambda s: s
+
+    def write_pins(f, parent, **keys):
+        for pin_name, pin in _group_items(parent, 'pin'):
+            f.write(_json_record(convert_attr, pin, ('timing',), record='pin', **keys, pin=pin_name))
+            for number, timing in _group_items(pin, 'timing'):
+                f.write(_json_record(convert_attr, timing, record='timing', **keys, pin=pin_name, timing=number))
 
     with open(filename, 'w') as f:
-        json.dump(d, f)
+        for lib in libs:
+            f.write(_json_record(convert_attr, lib, ('cell',), record='library', library=lib.name))
+            for cell_name, cell in _group_items(lib, 'cell'):
+                f.write(_json_record(convert_attr, cell, ('pin', 'bus'), record='cell', library=lib.name,
+                                     cell=cell_name))
+                write_pins(f, cell, library=lib.name, cell=cell_name)
+                for bus_name, bus in _group_items(cell, 'bus'):
+                    f.write(_json_record(convert_attr, bus, ('pin',), record='bus', library=lib.name,
+                                         cell=cell_name, bus=bus_name))
+                    write_pins(f, bus, library=lib.name, cell=cell_name, bus=bus_name)
@@ -0,0 +1,55 @@
+"""Round trip of parsed libraries through pickle
+
+Run with pytest or directly: python3 test_pickle.py
+"""
+import importlib
+import io
+import os
+import pickle
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from logic.models import Liberty
+
+SAMPLE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'doc', 'templates', 'Nangate_cut.lib')
+
+
+def round_trip(lib):
+    return pickle.loads(pickle.dumps(lib, pickle.HIGHEST_PROTOCOL))
+
+
+def dumped(lib):
+    buffer = io.StringIO()
+    lib.dump(buffer, '')
+    return buffer.getvalue()
+
+
+def test_default_parser():
+    Liberty.set_default_parser()
+    lib = Liberty.load(SAMPLE)
+    restored = round_trip(lib)
+    assert type(restored) is type(lib)
+    assert dumped(restored) == dumped(lib)
+
+
+def test_liberty_custom():
+    Liberty.set_default_parser()
+    if 'logic.liberty_custom' in sys.modules:
+        importlib.reload(sys.modules['logic.liberty_custom'])
+    else:
+        importlib.import_module('logic.liberty_custom')
+    try:
+        lib = Liberty.load(SAMPLE)
+        restored = round_trip(lib)
+        assert type(restored) is type(lib)
+        assert restored.to_json_dict() == lib.to_json_dict()
+        for cell in restored.cell.values():
+            assert all(cell.pin[name] is pin for name, pin in cell.inputs.items())
+    finally:
+        Liberty.set_default_parser()
+
+
+if __name__ == '__main__':
+    test_default_parser()
+    test_liberty_custom()
+    print('ok')
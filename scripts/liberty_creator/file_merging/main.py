@@ -1,10 +1,14 @@
+import json
+
 from file_merging import misc_funcs
 from file_merging import axis_funcs
 from file_merging import merging
+from file_merging import patch_funcs
 from file_merging.logic.models import Liberty
 
 
-def merge_lib(data_from, data_to, clock_names= [], size=-1.0, leakage=-1.0, conditions='nothing yet'):
+def merge_lib(data_from, data_to, clock_names= [], size=-1.0, leakage=-1.0, conditions='nothing yet', dedup=False,
+              changed_points=None, workers=1):
     """
     Main function that execute merge method.
     data_from: data input directory
@@ -13,13 +17,30 @@ def merge_lib(data_from, data_to, clock_names= [], size=-1.0, leakage=-1.0, cond
     size: size of an area
     leakage: power leakage
     conditions: operating_conditions
-
+    dedup: collapse identical templates and tables of the final library
+    changed_points: (clock transition, pin transition) pairs of re-characterized grid files;
+                    if set, values of these points are patched into the existing final library
+                    instead of merging all files from scratch
+    workers: number of processes parsing the grid files
+
+    return (True, report), report is the deduplication report of dedup_funcs.dedup_library, empty if dedup is disabled;
+    with dedup the report is also written next to the final library as <result_name>.dedup.json,
+    because liberty_creator.tcl treats any output of merge_lib.py as an error.
+    With changed_points return (True, number of rewritten tables),
+    or (False, error message) if some of the points match no grid file, the final library is then left untouched
     """
 
+    if changed_points:
+        unmatched = patch_funcs.unmatched_points(data_from, changed_points)
+        if unmatched:
+            return False, 'No grid files for changed points (clock transition, pin transition): ' + \
+                ', '.join('({}, {})'.format(clk, pin) for clk, pin in unmatched)
+        return True, patch_funcs.patch_lib(data_from, data_to, changed_points)
+
     if clock_names:
         clock_names = clock_names.split()
 
-    data_files, net_transitions = misc_funcs.data_load(data_from)
+    data_files, net_transitions = misc_funcs.data_load(data_from, workers)
 
     tmp_list = []
     for trans in net_transitions:
@@ -38,20 +59,17 @@ def merge_lib(data_from, data_to, clock_names= [], size=-1.0, leakage=-1.0, cond
     data_from = data_from.split('/')[-1]
     result_name = data_from + '_' + cell_name + '.lib'
 
-    if hasattr(data_template, 'comment'):
-        data_template.comment = '""'
-    with open(data_to + '/' + result_name, 'w', encoding='utf-8') as final_solution:
-        data_template.dump(final_solution, '')
-
-    misc_funcs.post_formatting(data_to, result_name, cell_name, net_transitions, clock_names,
-                               temperature, voltage, size, leakage, conditions)
-    misc_funcs.post_post_formatting(data_to, result_name)
+    report = misc_funcs.post_formatting(data_template, data_to, result_name, net_transitions, clock_names,
+                                        temperature, voltage, size, leakage, conditions, dedup)
+    if dedup:
+        with open(data_to + '/' + result_name + '.dedup.json', 'w') as f:
+            json.dump(report, f, indent=2)
 
     # print(data_to + '/' + result_name)
 
     merging.tmp_clr(data_to=data_to)
 
-    return True
+    return True, report
 
 
 # merge_lib('data/ss_100C_1v60',
@@ -1,6 +1,55 @@
+import mmap
 import os
 import re
-import math
+from contextlib import ExitStack
+
+
+def map_file(stack, file_path):
+    """
+    Map file into memory for reading, the map is closed with the stack.
+    stack: ExitStack owning the map
+    file_path: path to file
+    """
+    with open(file_path, 'rb') as f:
+        return stack.enter_context(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+
+VALUES_LINE = re.compile(rb'^[^\n]*?values', re.MULTILINE)
+
+
+def grid_files(data_dir):
+    """
+    Return sorted names of grid .lib files of the data directory, other files are ignored.
+    data_dir: input data directory
+    """
+    return sorted(file_name for file_name in os.listdir(data_dir) if os.path.splitext(file_name)[1] == '.lib')
+
+
+def check_values_count(data, buffers):
+    """
+    Raise ValueError if files have different number of lines with values, i.e. they can not be merged line by line.
+    data: file names
+    buffers: mapped files in the same order
+    """
+    counts = [len(VALUES_LINE.findall(buffer)) for buffer in buffers]
+    different = [f'{file_name} ({count})' for file_name, count in zip(data, counts) if count != counts[0]]
+    if different:
+        raise ValueError(f'Grid files have different number of values lines than {data[0]} ({counts[0]}): '
+                         + ', '.join(different))
+
+
+def values_lines(buffer):
+    """
+    Yield (start, end) spans of lines containing 'values', end includes line break.
+    buffer: mapped file
+    """
+    pos = buffer.find(b'values')
+    while pos != -1:
+        start = buffer.rfind(b'\n', 0, pos) + 1
+        end = buffer.find(b'\n', pos)
+        end = len(buffer) if end == -1 else end + 1
+        yield start, end
+        pos = buffer.find(b'values', end)
 
 
 def parse_indices(data_dir):
@@ -15,150 +64,157 @@ def parse_indices(data_dir):
 
     return indices of different strings.
     """
-    data = os.listdir(data_dir)
-
-    all_data_indices = set()
-    lib_sample = open(data_dir + '/' + data[0])
-    for count, line in enumerate(lib_sample):
-        if re.search('values', line):
-            all_data_indices.add(count)
+    data = grid_files(data_dir)
+
+    all_data_indices = []
+    with ExitStack() as stack:
+        lib_sample = map_file(stack, data_dir + '/' + data[0])
+        count = 0
+        pos = 0
+        for start, end in values_lines(lib_sample):
+            count += lib_sample[pos:start].count(b'\n')
+            all_data_indices.append(count)
+            count += 1
+            pos = end
 
-    all_data_indices = list(all_data_indices)
-    all_data_indices.sort()
     return all_data_indices
 
 
-def merge(data_dir, data_to, diff_lines, net_transitions):
-    """
-    Main function of a file.
-    Merge files by indices of different lines.
-    data_dir: input data directory
-    data_to: output data directory
-    diff_lines: indices of different lines
-    net_transitions: net transition
-    """
-    data = os.listdir(data_dir)
-    lib_sample = open(data_dir + '/' + data[0])
-    merged_data = {}
+SCALAR_VALUE = re.compile(r'"[-+]?\d*\.*\d+"')
+NUMBER = re.compile(r'[-+]?\d*\.*\d+')
+BYTES_SCALAR_VALUE = re.compile(rb'"[-+]?\d*\.*\d+"')
+BYTES_NUMBER = re.compile(rb'[-+]?\d*\.*\d+')
 
-    indices_scalar = []
 
-    data = sorted(data)
-
-    for i, line in enumerate(lib_sample):
-        if i in diff_lines:
-            line = line.replace(' ', '')
-            if re.search(r'"[-+]?\d*\.*\d+"', line):
-                indices_scalar.append(i)
+def merge_scalar_line(items, col_data_len):
+    """
+    Merge scalar values of the same line from all files into a table.
+    items: values of the line from every file in sorted order, each followed by ', '
+    col_data_len: number of net transitions
 
-    for index in diff_lines:
-        merged_data[index] = []
+    return merged line
+    """
+    tmp = ['']
+    cnt = 0
+    len_data = len(items)
+    row_data_len = len_data / col_data_len
+    for counter, item in enumerate(items):
+        if (((counter + 1) % row_data_len) == 0) and (counter != 0):
+            items[counter] = items[counter][0:-1]
+            if ((counter + 1) % len_data) != 0:
+                items[counter] = items[counter][0:-1]
+                items[counter] = items[counter] + '", \ \n'
+            else:
+                items[counter] = items[counter][0:-1] + '" \n'
+
+        if (counter == 0) or (((counter + 1) % row_data_len) == 1):
+            items[counter] = '"' + items[counter]
+
+        tmp[cnt] = tmp[cnt] + items[counter]
+        if (((counter + 1) % row_data_len) == 0) and (counter != 0):
+            cnt = cnt + 1
+            tmp.append('')
+
+    if len(tmp) > 1:
+        items = tmp[0:-1]
+    if len(items) > 0:
+        items[-1] = items[-2] + ');'
+        items[0] = 'values \t( ' + items[0]
+        items[-1] = items[-1].replace(', \\ \n);', '");')
+        items[-1] = items[-1][0:-4] + '); \n'
+
+    return ''.join(items)
+
+
+def merge_table_line(rows):
+    """
+    Merge one-dimensional tables of the same line from files with equal clock and pin transitions.
+    rows: values of the line from every such file in sorted order, joined with ', '
 
-    for index in indices_scalar:
-        if index in diff_lines:
-            diff_lines.remove(index)
+    return merged line
+    """
+    items = ['"' + row + '", \\ \n' for row in rows]
 
-    for file_name in data:
-        for count, line in enumerate(open(data_dir + '/' + file_name)):
-            if count in indices_scalar:
-                tmp = re.search(r'"[-+]?\d*\.*\d+"', line).group(0)[1:-1] + ', '
+    if len(items) > 0:
+        items[-1] = items[-1][0:-4] + '); \n'
+        items[0] = 'values \t(' + items[0]
+        items[-1] = items[-1][0:-5] + '); \n'
 
-                merged_data[count].append(tmp)
+    return ''.join(items)
 
-    tmp = ['']
-    cnt = 0
-    for key in indices_scalar:
-        col_data_len = int(len(net_transitions))
-        len_data = len(merged_data[key])
-        row_data_len = len_data / col_data_len
-        for counter, item in enumerate(merged_data[key]):
-            if (((counter + 1) % row_data_len) == 0) and (counter != 0):
-                merged_data[key][counter] = merged_data[key][counter][0:-1]
-                if ((counter + 1) % len_data) != 0:
-                    merged_data[key][counter] = merged_data[key][counter][0:-1]
-                    merged_data[key][counter] = merged_data[key][counter] + '", \ \n'
-                else:
-                    merged_data[key][counter] = merged_data[key][counter][0:-1] + '" \n'
 
-            if (counter == 0) or (((counter + 1) % row_data_len) == 1):
-                merged_data[key][counter] = '"' + merged_data[key][counter]
+def write_sample(out, view, start, end):
+    """
+    Write part of the sample file without copying it, 'scalar' is replaced with '%sample%'.
+    out: output file
+    view: memoryview of the sample file
+    start, end: span to write
+    """
+    buffer = view.obj
+    pos = buffer.find(b'scalar', start, end)
+    while pos != -1:
+        out.write(view[start:pos])
+        out.write(b'%sample%')
+        start = pos + len(b'scalar')
+        pos = buffer.find(b'scalar', start, end)
+    out.write(view[start:end])
 
-            tmp[cnt] = tmp[cnt] + merged_data[key][counter]
-            if (((counter + 1) % row_data_len) == 0) and (counter != 0):
-                cnt = cnt + 1
-                tmp.append('')
 
-        if len(tmp) > 1:
-            merged_data[key] = tmp[0:-1]
-        if len(merged_data[key]) > 0:
-            merged_data[key][-1] = merged_data[key][-2] + ');'
-        tmp = ['']
-        cnt = 0
+def merge(data_dir, data_to, diff_lines, net_transitions):
+    """
+    Main function of a file.
+    Merge files by indices of different lines.
+    All files have the same structure, files are mapped into memory and only lines with values
+    are located and read, the rest of the sample file is written to the output as is.
+    Memory use does not depend on the number and size of files.
+    Only .lib files are merged, ValueError is raised if their numbers of values lines differ.
 
-    for key in indices_scalar:
-        if len(merged_data[key]) > 0:
-            merged_data[key][0] = 'values 	( ' + merged_data[key][0]
-            merged_data[key][-1] = merged_data[key][-1].replace(', \\ \n);', '");')
+    data_dir: input data directory
+    data_to: output data directory
+    diff_lines: indices of different lines
+    net_transitions: net transition
+    """
+    data = grid_files(data_dir)
+    diff_lines = set(diff_lines)
 
+    table_files = []
     for file_name in data:
         clk, clk_val, pin, pin_val = file_name[file_name.find('clk'):].split('_')
-
-        if clk_val == pin_val[0:-4]:
-            for count, line in enumerate(open(data_dir + '/' + file_name)):
-                if count in diff_lines:
-                    tmp = str()
-                    tmp_arr = re.findall(r'[-+]?\d*\.*\d+', line)
-                    tmp_arr[-1] = tmp_arr[-1] + '", \ \n'
-                    tmp_arr[0] = '"' + tmp_arr[0]
-                    for item in tmp_arr:
-                        tmp = tmp + item + ', '
-
-                    tmp = tmp[0:-2]
-                    merged_data[count].append(tmp)
-
-        if clk_val == 'NaN':
-            for count, line in enumerate(open(data_dir + '/' + file_name)):
-                if count in diff_lines:
-                    tmp = str()
-                    tmp_arr = re.findall(r'[-+]?\d*\.*\d+', line)
-                    tmp_arr[-1] = tmp_arr[-1] + '", \ \n'
-                    tmp_arr[0] = '"' + tmp_arr[0]
-                    for item in tmp_arr:
-                        tmp = tmp + item + ', '
-
-                    tmp = tmp[0:-2]
-                    merged_data[count].append(tmp)
-
-    for key in merged_data:
-        if len(merged_data[key]) > 0:
-            merged_data[key][-1] = merged_data[key][-1][0:-4] + '); \n'
-
-    for key in diff_lines:
-        if len(merged_data[key]) > 0:
-            merged_data[key][0] = 'values 	(' + merged_data[key][0]
-            merged_data[key][-1] = merged_data[key][-1][0:-5] + '); \n'
-
-    counter = 0
-    new_lib = []
-    lib_sample = open(data_dir + '/' + data[0])
-    for i, line in enumerate(lib_sample):
-        if i in merged_data:
-            tmp = merged_data[i]
-            counter = counter + len(merged_data[i])
-        else:
-            tmp = line
-        new_lib.append(''.join(tmp))
-
-    new_lib_file = open(data_to + '/tmp.lib', 'w')
-    # print(new_lib_file)
-    for line in new_lib:
-        if re.search(r'scalar', line):
-            tmp = line.replace('scalar', '%sample%')
-        else:
-            tmp = line
-        new_lib_file.write(tmp)
-
-    return merged_data
+        table_files.append(clk_val == pin_val[0:-4] or clk_val == 'NaN')
+
+    with ExitStack() as stack:
+        buffers = [map_file(stack, data_dir + '/' + file_name) for file_name in data]
+        check_values_count(data, buffers)
+        lib_sample = buffers[0]
+        view = stack.enter_context(memoryview(lib_sample))
+        new_lib_file = stack.enter_context(open(data_to + '/tmp.lib', 'wb', buffering=1 << 20))
+
+        count = 0
+        pos = 0
+        for spans in zip(*[values_lines(buffer) for buffer in buffers]):
+            start, end = spans[0]
+            count += lib_sample[pos:start].count(b'\n')
+            write_sample(new_lib_file, view, pos, start)
+
+            if count in diff_lines:
+                if BYTES_SCALAR_VALUE.search(lib_sample[start:end].replace(b' ', b'')):
+                    items = [BYTES_SCALAR_VALUE.search(buffer, *span).group(0)[1:-1].decode() + ', '
+                             for buffer, span in zip(buffers, spans)]
+                    line = merge_scalar_line(items, len(net_transitions))
+                else:
+                    line = merge_table_line([b', '.join(BYTES_NUMBER.findall(buffer, *span)).decode()
+                                             for buffer, span, is_table in zip(buffers, spans, table_files)
+                                             if is_table])
+                if 'scalar' in line:
+                    line = line.replace('scalar', '%sample%')
+                new_lib_file.write(line.encode())
+            else:
+                write_sample(new_lib_file, view, start, end)
+
+            count += 1
+            pos = end
+
+        write_sample(new_lib_file, view, pos, len(lib_sample))
 
 
 def tmp_clr(data_to):
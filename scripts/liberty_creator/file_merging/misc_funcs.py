@@ -1,16 +1,19 @@
 from typing import Tuple, List, Any
 
 from file_merging.logic.models import Liberty
-from data_processing.lib_funcs import get_leakage_power_unit
+from file_merging import dedup_funcs
+from file_merging import template_funcs
+from concurrent.futures import ProcessPoolExecutor
 import os
 import re
 import copy
 
 
-def data_load(data_dir: str) -> Tuple[List[Any], List[Tuple[Any, ...]]]:
+def data_load(data_dir: str, workers: int = 1) -> Tuple[List[Any], List[Tuple[Any, ...]]]:
     """
     Return tuple of data files and net transition.
     Data_dir: String path to data directory.
+    workers: number of processes parsing the files
     """
     data_files = list()
     data = list()
@@ -30,8 +33,8 @@ def data_load(data_dir: str) -> Tuple[List[Any], List[Tuple[Any, ...]]]:
             if clk_val == pin_val:
                 data.append(t_file)
 
-    for count, file in enumerate(data):
-        lib = Liberty.load(data_dir + '/' + data[count])
+    libs = Liberty.load_many([data_dir + '/' + file for file in data], workers)
+    for file, lib in zip(data, libs):
         if re.search('.lib', file):
             data_files.append(lib)
             input_net_transitions.append(tuple(re.findall("\d+\.\d+", file[file.rfind('clk'):])))
@@ -39,23 +42,63 @@ def data_load(data_dir: str) -> Tuple[List[Any], List[Tuple[Any, ...]]]:
     return data_files, input_net_transitions
 
 
-def data_load_legacy(data_dir):
+def data_load_legacy(data_dir, workers=1):
     """
     Legacy data load. Useful for tests.
+    workers: number of processes parsing the files
     """
     data_files = []
     data = os.listdir(data_dir)
     input_net_transitions = []
 
-    for count, file in enumerate(data):
-        lib = Liberty.load(data_dir + '/' + data[count])
-
+    libs = Liberty.load_many([data_dir + '/' + file for file in data], workers)
+    for file, lib in zip(data, libs):
         if re.search('.lib', file):
             input_net_transitions.append(tuple(re.findall("\d+\.\d+", file)))
             data_files.append((tuple(re.findall("\d+\.\d+", file)), lib))
     return data_files
 
 
+def table_values(tables):
+    """
+    Return {template name: values} for a dictionary of timing tables.
+    tables: named groups such as cell_rise or rise_constraint
+    """
+    return {name: table.values for name, table in tables.items()}
+
+
+def bus_timing_index(cell):
+    """
+    Return {bus name: {bus pin name: timing list}} for bus pins that have timing,
+    so merging can look bus pins up by name instead of scanning every bus.
+    cell: cell of a grid library
+    """
+    index = {}
+    for bus_name, bus in getattr(cell, 'bus', {}).items():
+        index[bus_name] = {}
+        for pin_name, pin in getattr(bus, 'pin', {}).items():
+            if hasattr(pin, 'timing'):
+                index[bus_name][pin_name] = pin.timing
+    return index
+
+
+def parallel_map(func, items, workers=1):
+    """
+    Apply func to every item, return list of results in the order of items.
+    If workers > 1 the items are distributed over a pool of worker processes,
+    so func must be a module-level function and items must be picklable.
+
+    func: function of one argument
+    items: list of arguments
+    workers: number of worker processes
+    """
+    if workers > 1 and len(items) > 1:
+        chunksize = max(1, len(items) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(func, items, chunksize=chunksize))
+    return [func(item) for item in items]
+
+
 def get_temp_volt(data):
     """
     Parse data for temperature and voltage.
@@ -69,15 +112,65 @@ def get_temp_volt(data):
     return temp, voltage
 
 
-def post_formatting(data_to, result_name, name, input_net_transitions, clk_names, temperature, volt, size, leak, conditions):
+class PostFormattingWriter:
+    """
+    File-like wrapper that applies post-formatting text transforms to a library while it is dumped.
+    Every complete line written through it is rewritten and passed on to the output file,
+    so the final .lib is produced in one write without reading it back.
+
+    f: output file
+    sample_name: template name that replaces %sample% in rise_constraint/fall_constraint groups
+    lib_block: lines with area, cell_leakage_power and operating_conditions inserted after nom_voltage
+    """
+
+    def __init__(self, f, sample_name, lib_block):
+        self.f = f
+        self.sample_name = sample_name
+        self.lib_block = lib_block
+        self.pending = ''
+
+    def write(self, text):
+        lines = (self.pending + text).split('\n')
+        self.pending = lines.pop()
+        for line in lines:
+            self.f.write(self.format_line(line + '\n'))
+
+    def flush(self):
+        if self.pending:
+            self.f.write(self.format_line(self.pending))
+            self.pending = ''
+
+    def format_line(self, line):
+        if 'library_features' in line:
+            return ''
+
+        if 'rise_constraint (%sample%)' in line or 'fall_constraint (%sample%)' in line:
+            line = line.replace('%sample%', self.sample_name)
+
+        if 'related_pin' in line:
+            line = line.split()
+            line[0] = '\t\t' + line[0] + ' '
+            line[-1] = ' "' + line[-1][0:-1] + '";\n'
+            line = ''.join(line)
+
+        if 'nom_voltage' in line:
+            indent = line[:len(line) - len(line.lstrip())]
+            line += ''.join(indent + item + '\n' for item in self.lib_block)
+
+        return line
+
+
+def post_formatting(lib, data_to, result_name, input_net_transitions, clk_names, temperature, volt, size, leak, conditions,
+                    dedup=False):
     """
-    Formatting dumped .lib.
+    Formatting and dumping of the merged .lib.
     Also add a structure with a size area size, cell_leakage_power, operating_conditions,
     process  type (hard-coded) 1.0, voltage, temperature and tree_type (hard-coded) "balanced_tree"
+    All text transforms are applied in one pass while the library is dumped.
 
+    lib: merged library
     data_to: Output directory
     result_name: Name of the dump
-    name:
     input_net_transitions: net transitions
     clk_names: list of clocks
     temperature: temperature
@@ -85,55 +178,21 @@ def post_formatting(data_to, result_name, name, input_net_transitions, clk_names
     size: size of an area
     leak: leaking data
     conditions: operating_conditions
+    dedup: collapse identical templates and tables before dumping, see dedup_funcs.dedup_library
 
+    return deduplication report, empty if dedup is disabled
     """
-    file_name = data_to + '/' + result_name
-    lib = Liberty.load(file_name)
-
-    template_counter = []
-    temp_template_counter = []
-
-    pin_data = []
-    bus_data = []
-
-    if hasattr(lib.cell[name], 'bus'):
-        bus_data = lib.cell[name].bus
-    if hasattr(lib.cell[name], 'pin'):
-        pin_data = lib.cell[name].pin
-
-    bus_keys = []
-    pin_keys = []
-
-    for bus in bus_data:
-        bus_keys.append(bus)
-
-    for pin in pin_data:
-        pin_keys.append(pin)
-
-    with open(file_name, 'r') as file:
-        for line in file:
-            if 'template_' in line:
-                template_counter.append(line)
-    file.close()
-
-    for item in template_counter:
-        temp_template_counter += re.findall(r'\d+', item)
-
-    template_counter = set(temp_template_counter)
-
-    temp = []
-    flag = False
+    manager = template_funcs.TemplateManager(lib)
+    template_name = manager.new_name()
 
     temperature = float(temperature)
     volt = float(volt.replace('v', '.'))
 
-    success, result = get_leakage_power_unit(file_name)
-    if not success:
-        leakage_power_unit = ''
-        print(result)
+    if not hasattr(lib, 'leakage_power_unit'):
+        print('No information about leakage_power_unit in Library')
         exit()
     else:
-        leakage_power_unit = result
+        leakage_power_unit = lib.leakage_power_unit
 
         prefix = leakage_power_unit[leakage_power_unit.find('1')+1:leakage_power_unit.find('W')]
         prefix_to_mul = float(prefix_dict.get(prefix, 'Неизвестная единица измерения leakage_power_unit'))
@@ -141,44 +200,18 @@ def post_formatting(data_to, result_name, name, input_net_transitions, clk_names
 
     cell_leakage_power = float(leak) / float(prefix_to_mul)
 
-    with open(file_name, 'r') as file:
-        for line in file:
-            if flag:
-                temporary = line
-                line = f'area : {size};' + '\n' + \
-                       f'cell_leakage_power : {cell_leakage_power};' + '\n' + \
-                       'operating_conditions' + ' ' + f'({conditions})' + '{ \n' + \
-                       f'process     :   1.0;' + '\n' + \
-                       f'voltage     :   {volt};' + '\n' + \
-                       f'temperature :    {temperature};' + '\n' + \
-                       f'tree_type   : "balanced_tree";' + '\n' \
-                       + '}' + '\n' + temporary
-                flag = False
-
-            if 'rise_constraint (%sample%)' in line:
-                line = line.replace('%sample%', f'template_{len(template_counter) + 1}')
+    lib_block = [f'area : {size};',
+                 f'cell_leakage_power : {cell_leakage_power};',
+                 f'operating_conditions ({conditions}) {{',
+                 f'  process : 1.0;',
+                 f'  voltage : {volt};',
+                 f'  temperature : {temperature};',
+                 f'  tree_type : balanced_tree;',
+                 '}']
 
-            if 'fall_constraint (%sample%)' in line:
-                line = line.replace('%sample%', f'template_{len(template_counter) + 1}')
+    template = copy.deepcopy(manager.last())
 
-            if 'library_features' in line:
-                line = ''
-
-            if 'nom_voltage' in line:
-                flag = True
-
-            temp.append(line)
-    file.close()
-
-    with open(file_name, 'w') as file:
-        for line in temp:
-            file.write(line)
-    file.close()
-
-    for key in lib.lu_table_template:
-        template = copy.deepcopy(lib.lu_table_template[key])
-
-    if clk_names:
+    if clk_names and template is not None:
         temp = []
         for item in input_net_transitions:
             temp.append(item[0])
@@ -201,56 +234,27 @@ def post_formatting(data_to, result_name, name, input_net_transitions, clk_names
         template.variable_1 = 'constrained_pin_transition'
         template.variable_2 = 'related_pin_transition'
 
-        template.name = f'template_{len(template_counter) + 1}'
-
-    lib = Liberty.load(file_name)
+        template.name = template_name
 
-    for key in lib.lu_table_template:
-        temp = tuple(lib.lu_table_template[key].index_1.split())
-        temp_name = lib.lu_table_template[key].variable_1
+    if hasattr(template, 'index_2'):
+        manager.transpose()
 
-        if hasattr(template, 'index_2'):
-            lib.lu_table_template[key].index_1 = tuple(lib.lu_table_template[key].index_2.split())
-            lib.lu_table_template[key].index_2 = temp
-
-        if hasattr(template, 'index_2'):
-            lib.lu_table_template[key].variable_1 = lib.lu_table_template[key].variable_2.split()
-            lib.lu_table_template[key].variable_2 = temp_name
-
-    if clk_names:
-        lib.lu_table_template[template.name] = template
+    if clk_names and template is not None:
+        template_name = manager.add(template)
 
     lib.comment = '""'
 
-    # print('AAAAA\n' + lib.nom_temperature + '\n' + lib.nom_voltage + '\nAAAAAAAAAAAAA')
-
-    # lib.nom_temperature = float(temperature)
-    # volt = volt.replace('v', '.')
-    # lib.nom_voltage = float(volt)
+    report = {}
+    if dedup:
+        report = dedup_funcs.dedup_library(lib)
+        template_name = report['renamed'].get(template_name, template_name)
 
     with open(data_to + '/' + result_name, 'w', encoding='utf-8') as final_solution:
-        lib.dump(final_solution, '')
-
-    return 0
-
-def post_post_formatting(data_to, result_name):
-    temp = []
-    file_name = data_to + '/' + result_name
-    with open(file_name, 'r') as file:
-        for line in file:
-            if 'related_pin' in line:
-                line = line.split()
-                line[0] = '\t\t' + line[0] + ' '
-                line[-1] = ' "' + line[-1][0:-1] + '";\n'
-                line = ''.join(line)
-
-            temp.append(line)
-        file.close()
-
-    with open(file_name, 'w') as file:
-        for line in temp:
-            file.write(line)
-    file.close()
+        writer = PostFormattingWriter(final_solution, template_name, lib_block)
+        lib.dump(writer, '')
+        writer.flush()
+
+    return report
 
 
 prefix_dict = {'y': 1e-24,  # yocto
@@ -0,0 +1,198 @@
+import os
+import re
+
+from file_merging import merging
+
+
+TOKEN = re.compile(r'"[^"]*"|[{};]')
+ROW = re.compile(r'"([^"]*)"')
+
+
+def table_spans(text):
+    """
+    Return {table path: (start, end)} for every values attribute of the library text.
+    Table path is built from types and names of the enclosing groups,
+    unnamed groups are numbered in order of appearance.
+    The table itself is identified by its type and number, because table names
+    (templates) differ between grid files and the final library.
+
+    text: library text
+    """
+    spans = {}
+    stack = [((), {})]
+    pos = 0
+    for match in TOKEN.finditer(text):
+        token = match.group(0)
+        if token[0] == '"':
+            continue
+
+        if token == '{':
+            group_type, _, name = text[pos:match.start()].partition('(')
+            group_type = group_type.strip()
+            name = name[:name.rfind(')')].replace('"', '').strip()
+            path, counter = stack[-1]
+            number = counter.get(group_type, 0)
+            counter[group_type] = number + 1
+            stack.append((path + ((group_type, name, number),), {}))
+        elif token == '}':
+            stack.pop()
+        else:
+            statement = text[pos:match.start()]
+            if statement.strip().startswith('values'):
+                path = stack[-1][0]
+                key = tuple((t, name if name else number) for t, name, number in path[:-1]) \
+                    + ((path[-1][0], path[-1][2]),)
+                spans[key] = (pos + statement.find('values'), match.end())
+        pos = match.end()
+
+    return spans
+
+
+def grid_files(data_dir):
+    """
+    Return sorted grid file names and flags of files with equal clock and pin transitions
+    (or without clock), in the same order as merging.merge reads them.
+    data_dir: input data directory
+    """
+    data = merging.grid_files(data_dir)
+    table_files = []
+    for file_name in data:
+        clk, clk_val, pin, pin_val = file_name[file_name.find('clk'):].split('_')
+        table_files.append(clk_val == pin_val[0:-4] or clk_val == 'NaN')
+    return data, table_files
+
+
+def grid_points(data):
+    """
+    Return (clock transition, pin transition) pairs of grid files as written in their names.
+    data: grid file names
+    """
+    points = []
+    for file_name in data:
+        clk, clk_val, pin, pin_val = file_name[file_name.find('clk'):].split('_')
+        points.append((clk_val, pin_val[0:-4]))
+    return points
+
+
+def unmatched_points(data_from, changed_points):
+    """
+    Return sorted changed points which do not match any grid file.
+    data_from: data input directory with grid files
+    changed_points: (clock transition, pin transition) pairs
+    """
+    data, table_files = grid_files(data_from)
+    return sorted({(str(clk), str(pin)) for clk, pin in changed_points} - set(grid_points(data)))
+
+
+def scalar_layout(files_count, col_data_len):
+    """
+    Return list of (row, column) positions in the merged table for every file's scalar value.
+    Positions are found by merging marker values with merging.merge_scalar_line,
+    so the layout is exactly the one of a full merge, including rows it repeats.
+
+    files_count: number of grid files
+    col_data_len: number of net transitions
+    """
+    items = ['#{}#, '.format(i) for i in range(files_count)]
+    line = merging.merge_scalar_line(items, col_data_len)
+    # the last row of a merged line may lack its closing quote, Liberty parser reads it up to ')'
+    rows = ROW.findall(line[line.find('(') + 1:line.find(')')] + '"')
+
+    layout = [[] for _ in range(files_count)]
+    for row, line in enumerate(rows):
+        for column, item in enumerate(line.split(',')):
+            item = item.strip()
+            if item.startswith('#'):
+                layout[int(item.strip('#'))].append((row, column))
+    return layout
+
+
+def patch_values(statement, positions):
+    """
+    Replace items of merged values, return new statement.
+    statement: values attribute text from the final library
+    positions: {(row, column): value}, column None replaces the whole row with list of values
+    """
+    rows = [row.split(', ') for row in ROW.findall(statement)]
+    for (row, column), value in positions.items():
+        if column is None:
+            rows[row] = value
+        else:
+            rows[row][column] = value
+
+    rows = iter(rows)
+    return ROW.sub(lambda match: '"' + ', '.join(next(rows)) + '"', statement)
+
+
+def cell_name(file_path):
+    """
+    Return name of the first cell of library file.
+    file_path: path to .lib file
+    """
+    with open(file_path) as f:
+        for line in f:
+            if line.strip().startswith('cell') and '(' in line:
+                return line[line.find('(') + 1:line.find(')')].replace('"', '').strip()
+    return ''
+
+
+def patch_lib(data_from, data_to, changed_points):
+    """
+    Incremental re-merge.
+    Values of re-characterized grid points are written into the existing final library,
+    the rest of the file is left untouched.
+
+    data_from: data input directory with all grid files, including the re-characterized ones
+    data_to: data output directory with the final library
+    changed_points: (clock transition, pin transition) pairs as written in grid file names,
+                    clock transition is 'NaN' for designs without clocks
+
+    return number of rewritten tables
+    """
+    data, table_files = grid_files(data_from)
+    changed_points = {(str(clk), str(pin)) for clk, pin in changed_points}
+
+    result_name = data_from.split('/')[-1] + '_' + cell_name(data_from + '/' + data[0]) + '.lib'
+    result_path = data_to + '/' + result_name
+    with open(result_path) as f:
+        text = f.read()
+    spans = table_spans(text)
+
+    layout = scalar_layout(len(data), sum(table_files))
+    table_rows = [sum(table_files[:i]) if is_table else None for i, is_table in enumerate(table_files)]
+
+    positions = {}
+    for index, (file_name, point) in enumerate(zip(data, grid_points(data))):
+        if point not in changed_points:
+            continue
+
+        with open(data_from + '/' + file_name) as f:
+            grid_text = f.read()
+
+        for path, (start, end) in table_spans(grid_text).items():
+            if path not in spans:
+                continue
+            statement = grid_text[start:end]
+            numbers = merging.NUMBER.findall(statement)
+            table_positions = positions.setdefault(path, {})
+            if merging.SCALAR_VALUE.search(statement.replace(' ', '')):
+                for position in layout[index]:
+                    table_positions[position] = numbers[0]
+            elif table_rows[index] is not None:
+                table_positions[(table_rows[index], None)] = numbers
+
+    chunks = []
+    pos = 0
+    for path, (start, end) in sorted(spans.items(), key=lambda item: item[1]):
+        if positions.get(path):
+            chunks.append(text[pos:start])
+            chunks.append(patch_values(text[start:end], positions[path]))
+            pos = end
+    chunks.append(text[pos:])
+
+    tmp_path = result_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(''.join(chunks))
+    os.replace(tmp_path, result_path)
+
+    return sum(1 for table_positions in positions.values() if table_positions)
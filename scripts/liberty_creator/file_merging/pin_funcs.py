@@ -1,4 +1,4 @@
-import copy
+TABLE_KINDS = ('cell_fall', 'cell_rise', 'fall_transition', 'rise_transition')
 
 
 def data_pin_init(timing_data, key):
@@ -28,69 +28,23 @@ def data_pin_init(timing_data, key):
 
 
 def table_merge(data):
-    all_data = []
-    temp_data = []
-    names = []
+    """
+    Merge tables with the same template name, return {template name: merged values}.
+    Values are read from the tables by reference, tables themselves are not copied.
+    data: list of (index, {template name: table}) from data_pin_init
+    """
     temp_dict = {}
+    all_data = {}
 
-    data_name = set()
+    for index, item in sorted(data, key=lambda x: x[0]):
+        for name, table in item.items():
+            if name not in temp_dict:
+                temp_dict[name] = []
+            temp_dict[name].append(table.values)
 
-    data = sorted(data, key=lambda x: x[0])
-
-    for item in data:
-        temp_data.append(item[1])
-
-    data = copy.deepcopy(temp_data)
-    temp_data.clear()
-
-    left_bracket = ''
-    right_bracket = ''
-    tab = ''
-    quotes = '\"'
-    comma = ''
-    line_feed = '\n'
-    slash = '\\'
-
-    for item in data:
-        for name, value in item.items():
-            data_name.add(name)
-            all_data.append({name: value.values})
-
-    for item in all_data:
-        for name, values in item.items():
-            names.append(name)
-
-    names = list(set(names))
-
-    for name in names:
-        for item in all_data:
-            if name in item.keys():
-                temp_data.append(item[name])
-        temp_dict[name] = temp_data
-        temp_data = []
-
-    all_data.clear()
-
-    for name, values in temp_dict.items():
-        temp_data = temp_dict[name]
-        temp_value = ''
-
-        for counter, value in enumerate(temp_data):
-            if counter != 0:
-                tab = '\t\t\t\t\t'
-
-            if counter == (len(value.split(sep=',')) - 1):
-                line_feed = ''
-                comma = ''
-                slash = ''
-
-            temp_value = temp_value + tab + value + comma + line_feed
-
-            tab = ''
-            line_feed = '\n'
-
-        all_data.append({name: temp_value})
-    return all_data, list(data_name)
+    for name, temp_data in temp_dict.items():
+        all_data[name] = tuple(num for value in temp_data for num in value.split())
+    return all_data
 
 
 def final_pin_data(data_files):
@@ -140,65 +94,13 @@ def final_pin_data(data_files):
         if hasattr(timing_data[key][0][0], 'cell_fall'):
             # TODO: maybe i should change the logic here
 
-            cell_fall_data, cell_rise_data, fall_transition_data, rise_transition_data = data_pin_init(timing_data, key)
-
-            cell_fall_data, cell_fall_names = table_merge(cell_fall_data)
-            cell_rise_data, cell_rise_names = table_merge(cell_rise_data)
-            fall_transition_data, fall_transition_names = table_merge(fall_transition_data)
-            rise_transition_data, rise_transition_names = table_merge(rise_transition_data)
-
-            for related_pin_instance in pins_final_data[key]:
-                pin_template_names = []
-                for template_name in related_pin_instance.cell_fall.keys():
-                    pin_template_names.append(template_name)
-
-                for pin_template_name in pin_template_names:
-                    if pin_template_name in cell_fall_names \
-                            and pin_template_name in related_pin_instance.cell_fall.keys():
-                        for cell_related_template in cell_fall_data:
-                            if pin_template_name in cell_related_template:
-                                related_pin_instance.cell_fall[pin_template_name].values = \
-                                    tuple(cell_related_template[pin_template_name].split())
-
-            for related_pin_instance in pins_final_data[key]:
-                pin_template_names = []
-                for template_name in related_pin_instance.cell_rise.keys():
-                    pin_template_names.append(template_name)
-
-                for pin_template_name in pin_template_names:
-                    if pin_template_name in cell_rise_names \
-                            and pin_template_name in related_pin_instance.cell_rise.keys():
-                        for cell_related_template in cell_rise_data:
-                            if pin_template_name in cell_related_template:
-                                related_pin_instance.cell_rise[pin_template_name].values = \
-                                    tuple(cell_related_template[pin_template_name].split())
-
-            for related_pin_instance in pins_final_data[key]:
-                pin_template_names = []
-                for template_name in related_pin_instance.fall_transition.keys():
-                    pin_template_names.append(template_name)
-
-                for pin_template_name in pin_template_names:
-                    if pin_template_name in fall_transition_names \
-                            and pin_template_name in related_pin_instance.fall_transition.keys():
-
-                        for cell_related_template in fall_transition_data:
-                            if pin_template_name in cell_related_template:
-                                related_pin_instance.fall_transition[pin_template_name].values = \
-                                    tuple(cell_related_template[pin_template_name].split())
-
-            for related_pin_instance in pins_final_data[key]:
-                pin_template_names = []
-                for template_name in related_pin_instance.rise_transition.keys():
-                    pin_template_names.append(template_name)
-
-                for pin_template_name in pin_template_names:
-                    if pin_template_name in rise_transition_names \
-                            and pin_template_name in related_pin_instance.rise_transition.keys():
-                        for cell_related_template in rise_transition_data:
-                            if pin_template_name in cell_related_template:
-                                related_pin_instance.rise_transition[pin_template_name].values = \
-                                    tuple(cell_related_template[pin_template_name].split())
+            for table_kind, data in zip(TABLE_KINDS, data_pin_init(timing_data, key)):
+                merged_data = table_merge(data)
+
+                for related_pin_instance in pins_final_data[key]:
+                    for template_name, table in getattr(related_pin_instance, table_kind).items():
+                        if template_name in merged_data:
+                            table.values = merged_data[template_name]
 
     for key in keys_pins:
         for obj in pins:
@@ -1,6 +1,8 @@
-import copy
 import math
 
+from file_merging import misc_funcs
+
+
 def pin_data_init(timing_data, key):
     rise_constraint_data = {}
     fall_constraint_data = {}
@@ -12,12 +14,12 @@ def pin_data_init(timing_data, key):
                 if i not in rise_constraint_data:
                     rise_constraint_data[i] = []
                 item.rise_constraint['scalar'].name = '%sample%'
-                rise_constraint_data[i].append(item.rise_constraint)
+                rise_constraint_data[i].append(misc_funcs.table_values(item.rise_constraint))
             if hasattr(item, 'fall_constraint'):
                 if i not in fall_constraint_data:
                     fall_constraint_data[i] = []
                 item.fall_constraint['scalar'].name = '%sample%'
-                fall_constraint_data[i].append(item.fall_constraint)
+                fall_constraint_data[i].append(misc_funcs.table_values(item.fall_constraint))
 
             i = i + 1
         i = 0
@@ -60,7 +62,7 @@ def merge_pins(data):
     for scalar_table in data:
         keys = scalar_table.keys()
         for key in keys:
-            all_data_values.append(scalar_table[key].values)
+            all_data_values.append(scalar_table[key])
 
     for i, table in enumerate(all_data_values):
         all_data_values[i] = str.split(table)
@@ -156,7 +158,41 @@ def merge_bus(data):
 
     return all_data
 
-def final_data(data_files):
+def merge_pin_constraints(constraints):
+    """
+    Merge rise and fall constraints of one pin, runs in worker processes.
+    constraints: rise and fall constraint values from pin_data_init
+    """
+    rise_constraint_data, fall_constraint_data = constraints
+
+    merged_rise = {}
+    for i, instance in rise_constraint_data.items():
+        merged_rise[i] = merge_pins(instance).split()
+
+    merged_fall = {}
+    for i, instance in fall_constraint_data.items():
+        merged_fall[i] = merge_pins(instance).split()
+
+    return merged_rise, merged_fall
+
+
+def merge_bus_constraints(constraints):
+    """
+    Merge rise and fall constraints of one bus pin, runs in worker processes.
+    constraints: rise and fall constraint values from bus_data_init
+    """
+    bus_rise_constraint, bus_fall_constraint = constraints
+    return merge_bus(bus_rise_constraint), merge_bus(bus_fall_constraint)
+
+
+def final_data(data_files, workers=1):
+    """
+    Merge scalar constraints of pins and bus pins from all grid files into the cell of the first file.
+    Object-tree merge helper, not called by main.merge_lib: the merge flow merges the grid
+    files line by line with merging.merge, so workers here does not affect merge_lib.py.
+    data_files: loaded grid libraries
+    workers: number of processes used to merge constraints of different pins
+    """
     values = []
     final_data = []
     cell_name = ''
@@ -179,61 +215,46 @@ def final_data(data_files):
     # Bus
     if hasattr(values[0], 'bus'):
         for item in values:
-            keys_bus = []
-            keys_bus_related_pins = []
-            values_bus = []
-            bus_final_data = {}
+            keys_bus = list(item.bus)
+            keys_bus_related_pins = {}
 
-            for name, value in item.bus.items():
-                keys_bus.append(name)
-                values_bus.append(value)
-
-            for key in keys_bus:
-                for value in values_bus:
-                    if value.name == key:
-                        if hasattr(value, 'pin'):
-                            for related_pin in value.pin:
-                                if hasattr(value.pin[related_pin], 'timing'):
-                                    keys_bus_related_pins.append(related_pin)
-                    keys_bus_related_pins = list(set(keys_bus_related_pins))
-
-            for bus in values_bus:
-                for pin in bus.pin:
-                    temp_pin = bus.pin
-                    if temp_pin[pin].name in keys_bus_related_pins:
-                        if hasattr(temp_pin[pin], 'timing'):
-                            if temp_pin[pin].name not in timing_data_bus.keys():
-                                keys_bus_related_pins.append(temp_pin[pin].name)
-                                timing_data_bus[temp_pin[pin].name] = []
-                            if temp_pin[pin].name in timing_data_bus.keys():
-                                timing_data_bus[temp_pin[pin].name].append(temp_pin[pin].timing)
-
-            for key in keys_bus:
-                bus_final_data[key] = {}
-                for pin_key in keys_bus_related_pins:
-                    bus_final_data[key][pin_key] = timing_data_bus[pin_key][0]
+            for bus_pins in misc_funcs.bus_timing_index(item).values():
+                for pin_name, timing in bus_pins.items():
+                    if pin_name not in timing_data_bus:
+                        timing_data_bus[pin_name] = []
+                    timing_data_bus[pin_name].append(timing)
+                    keys_bus_related_pins[pin_name] = True
 
+        keys_bus_related_pins = list(keys_bus_related_pins)
         bus_rise_constraint, bus_fall_constraint = bus_data_init(timing_data_bus, keys_bus_related_pins)
-        for key in keys_bus:
+
+        # related pins' timing is the same for every bus, so each pin is merged once
+        merged_keys = []
+        if keys_bus:
             for related_key in keys_bus_related_pins:
-                if hasattr(bus_final_data[key][related_key][0], 'rise_constraint')\
-                        or hasattr(bus_final_data[key][related_key][0], 'fall_constraint'):
-                    bus_rise_constraint_data = merge_bus(bus_rise_constraint[related_key])
-                    bus_fall_constraint_data = merge_bus(bus_fall_constraint[related_key])
+                if hasattr(timing_data_bus[related_key][0][0], 'rise_constraint')\
+                        or hasattr(timing_data_bus[related_key][0][0], 'fall_constraint'):
+                    merged_keys.append(related_key)
+        constraints = [(bus_rise_constraint[key], bus_fall_constraint[key]) for key in merged_keys]
+        merged_constraints = dict(zip(merged_keys,
+                                      misc_funcs.parallel_map(merge_bus_constraints, constraints, workers)))
+
+        for key in keys_bus:
+            for related_key, related_pin in values[0].bus[key].pin.items():
+                if related_key in merged_constraints:
+                    bus_rise_constraint_data, bus_fall_constraint_data = merged_constraints[related_key]
 
                     for iteration in range(0, len(bus_rise_constraint_data)):
-                        if related_key in values[0].bus[key].pin:
-                            if hasattr(values[0].bus[key].pin[related_key].timing[iteration], 'rise_constraint'):
-                                    if 'scalar' in values[0].bus[key].pin[related_key].timing[iteration].rise_constraint:
-                                        values[0].bus[key].pin[related_key].timing[iteration].rise_constraint['scalar']\
-                                            .values = tuple(copy.deepcopy(bus_rise_constraint_data[iteration].split()))
+                        if hasattr(related_pin.timing[iteration], 'rise_constraint'):
+                            if 'scalar' in related_pin.timing[iteration].rise_constraint:
+                                related_pin.timing[iteration].rise_constraint['scalar'].values = \
+                                    tuple(bus_rise_constraint_data[iteration].split())
 
                     for iteration in range(0, len(bus_fall_constraint_data)):
-                        if related_key in values[0].bus[key].pin:
-                            if hasattr(values[0].bus[key].pin[related_key].timing[iteration], 'fall_constraint'):
-                                    if 'scalar' in values[0].bus[key].pin[related_key].timing[iteration].fall_constraint:
-                                        values[0].bus[key].pin[related_key].timing[iteration].fall_constraint['scalar']\
-                                            .values = tuple(copy.deepcopy(bus_fall_constraint_data[iteration].split()))
+                        if hasattr(related_pin.timing[iteration], 'fall_constraint'):
+                            if 'scalar' in related_pin.timing[iteration].fall_constraint:
+                                related_pin.timing[iteration].fall_constraint['scalar'].values = \
+                                    tuple(bus_fall_constraint_data[iteration].split())
 
 
     if hasattr(values[0], 'pin'):
@@ -266,29 +287,27 @@ def final_data(data_files):
             for key in pins:
                 pins_final_data[key] = timing_data[key][0]
 
+        merged_keys = []
+        constraints = []
         for key in pins:
             if hasattr(timing_data[key][0][0], 'rise_constraint') or hasattr(timing_data[key][0][0], 'fall_constraint'):
-                rise_constraint_data, fall_constraint_data = pin_data_init(timing_data, key)
-
-                merged_rise = {}
-                for i, instance in rise_constraint_data.items():
-                    merged_rise[i] = merge_pins(instance).split()
-
-                merged_fall = {}
-                for i, instance in fall_constraint_data.items():
-                    merged_fall[i] = merge_pins(instance).split()
-
-                for iteration in range(0, len(merged_rise)):
-                    if hasattr(values[0].pin[key].timing[iteration], 'rise_constraint'):
-                        if 'scalar' in values[0].pin[key].timing[iteration].rise_constraint:
-                            values[0].pin[key].timing[iteration].rise_constraint['scalar'].values \
-                                = tuple(copy.deepcopy(merged_rise[iteration]))
-
-                for iteration in range(0, len(merged_fall)):
-                    if hasattr(values[0].pin[key].timing[iteration], 'fall_constraint'):
-                        if 'scalar' in values[0].pin[key].timing[iteration].fall_constraint:
-                            values[0].pin[key].timing[iteration].fall_constraint['scalar'].values \
-                                = tuple(copy.deepcopy(merged_fall[iteration]))
+                merged_keys.append(key)
+                constraints.append(pin_data_init(timing_data, key))
+
+        merged_constraints = misc_funcs.parallel_map(merge_pin_constraints, constraints, workers)
+
+        for key, (merged_rise, merged_fall) in zip(merged_keys, merged_constraints):
+            for iteration in range(0, len(merged_rise)):
+                if hasattr(values[0].pin[key].timing[iteration], 'rise_constraint'):
+                    if 'scalar' in values[0].pin[key].timing[iteration].rise_constraint:
+                        values[0].pin[key].timing[iteration].rise_constraint['scalar'].values \
+                            = tuple(merged_rise[iteration])
+
+            for iteration in range(0, len(merged_fall)):
+                if hasattr(values[0].pin[key].timing[iteration], 'fall_constraint'):
+                    if 'scalar' in values[0].pin[key].timing[iteration].fall_constraint:
+                        values[0].pin[key].timing[iteration].fall_constraint['scalar'].values \
+                            = tuple(merged_fall[iteration])
 
 
 
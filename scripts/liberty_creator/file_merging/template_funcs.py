@@ -0,0 +1,91 @@
+from file_merging import dedup_funcs
+
+
+def flat_index(value):
+    """
+    Return template index as a tuple with a single comma separated string,
+    i.e. the way index is read back from a dumped library.
+    value: index_1 or index_2 of lu_table_template
+    """
+    if isinstance(value, tuple):
+        value = ','.join(value)
+    return tuple(value.replace('"', '').split())
+
+
+class TemplateManager:
+    """
+    lu_table_templates of a parsed library, indexed by their variables and indices.
+    Built once from the library, keeps the library's template dictionary up to date.
+    """
+
+    def __init__(self, lib):
+        """
+        lib: parsed library
+        """
+        self.lib = lib
+        self.templates = lib.lu_table_template if hasattr(lib, 'lu_table_template') else {}
+        self.index = {}
+        self.reindex()
+
+    def reindex(self):
+        """
+        Rebuild index of templates by (variables, indices), the first template of equal ones is kept.
+        """
+        self.index = {}
+        for name, template in self.templates.items():
+            self.index.setdefault(dedup_funcs.template_key(template), name)
+
+    def last(self):
+        """
+        Return the last template of the library or None.
+        """
+        template = None
+        for template in self.templates.values():
+            pass
+        return template
+
+    def find(self, template):
+        """
+        Return name of existing template with the same variables and indices or None.
+        template: lu_table_template group
+        """
+        return self.index.get(dedup_funcs.template_key(template))
+
+    def new_name(self):
+        """
+        Return template name which is not used in the library.
+        """
+        number = len(self.templates) + 1
+        while f'template_{number}' in self.templates:
+            number += 1
+        return f'template_{number}'
+
+    def add(self, template):
+        """
+        Add template to the library, return its name.
+        If the library already has a template with the same variables and indices, it is returned instead.
+        Template without name or with a name already in use is given a new unique name.
+        template: lu_table_template group
+        """
+        name = self.find(template)
+        if name is not None:
+            return name
+
+        if not getattr(template, 'name', '') or template.name in self.templates:
+            template.name = self.new_name()
+        self.templates[template.name] = template
+        if not hasattr(self.lib, 'lu_table_template'):
+            self.lib.lu_table_template = self.templates
+        self.index[dedup_funcs.template_key(template)] = template.name
+        return template.name
+
+    def transpose(self):
+        """
+        Swap the axes of every two-dimensional template: index_1 with index_2 and variable_1 with variable_2.
+        """
+        for template in self.templates.values():
+            if not hasattr(template, 'index_2'):
+                continue
+            template.index_1, template.index_2 = flat_index(template.index_2), flat_index(template.index_1)
+            template.variable_1, template.variable_2 = template.variable_2, template.variable_1
+        self.reindex()
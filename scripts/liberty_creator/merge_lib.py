@@ -7,6 +7,20 @@ clock_names = sys.argv[3]   # строка с именами тактовых с
 leakage = sys.argv[4]       # значение утечки мощности
 size = sys.argv[5]          # значение размера ячейки
 conditions = sys.argv[6]    # значение параметра default_operating_conditions
+options = sys.argv[7:]       # необязательные параметры: dedup, changed=<clk>_<pin>[,<clk>_<pin>...]
+dedup = 'dedup' in options  # флаг дедупликации шаблонов и таблиц
+
+# точки сетки (время переключения тактового сигнала и входа, как в именах промежуточных файлов),
+# значения которых переписываются в существующем конечном Liberty файле вместо полного объединения
+changed_points = None
+for option in options:
+    if option.startswith('changed='):
+        changed_points = [tuple(point.split('_')) for point in option[len('changed='):].split(',') if point]
 
 # вызов функции объединения промежуточных Liberty файлов
-merge_lib(data_from=data_from, data_to=data_to, clock_names=clock_names, size=size, leakage=leakage, conditions=conditions) # type: ignore
+success, result = merge_lib(data_from=data_from, data_to=data_to, clock_names=clock_names, size=size, leakage=leakage,
+                            conditions=conditions, dedup=dedup, changed_points=changed_points) # type: ignore
+
+# вывод сообщения об ошибке, любой вывод считается ошибкой в liberty_creator.tcl
+if not success:
+    print(result)